@@ -1,14 +1,36 @@
+import sys
+import warnings
 import numpy as np
-from scipy.optimize import newton
 import correlations
+import instrumentation
+import memo
+import planner
+from records import FIELDS, resolve_columns
 
 
-# I need to implement step-wise solver for Tb. For correlations with large variances
+class GasFraction(object):
 
+    # Calculate _sg_liq from mw first if mw is provided but _sg_liq is not
+    first_steps = [(correlations.mw_sg_liq, '_sg_liq')]
 
-class GasFraction(object):
+    # Shared by every instance and by the batch resolver, so that the dict of correlations is not rebuilt per object
+    correlations = {
+        correlations.mw_sg_gas: ['mw', 'sg_gas'],
+        correlations.mw_sg_liq: ['mw', '_sg_liq'],
+        correlations.Tb_mw_sg: ['Tb', 'mw', '_sg_liq'],
+        correlations.gas_ghv_sg: ['ghv', 'sg_gas'],
+        correlations.gas_nhv_sg: ['nhv', 'sg_gas'],
+    }
+    solve_planner = planner.SolvePlanner(correlations, first_steps)
 
     def __init__(self, mw=None, sg=None, VABP=None, ghv=None, nhv=None, Pc=None, Tc=None, omega=None, Tb=None):
+        # Identical inputs (to the 5 decimal places of the rounding below) skip the resolution
+        cache_key = memo.key(mw, sg, VABP, ghv, nhv, Pc, Tc, omega, Tb) if memo.enabled else None
+        cached = memo.caches['GasFraction'].get(cache_key) if cache_key is not None else None
+        if cached is not None:
+            self.attributes = dict(cached)
+            return
+
         # Note that 'sg' is assumed to be 'sg_gas' and there's no 'api' attribute
         self.attributes = {
             'mw': mw,
@@ -22,128 +44,204 @@ class GasFraction(object):
             'Tb': Tb,
             '_sg_liq': None  # Internal attribute for liquid specific gravity, calculated later
         }
-
-        self.correlations = {
-            correlations.mw_sg_gas: ['mw', 'sg_gas'],
-            correlations.mw_sg_liq: ['mw', '_sg_liq'],
-            correlations.Tb_mw_sg: ['Tb', 'mw', '_sg_liq'],
-            correlations.gas_ghv_sg: ['ghv', 'sg_gas'],
-            correlations.gas_nhv_sg: ['nhv', 'sg_gas'],
-        }
-        self.resolve_dependencies()
+        failed = self.resolve_dependencies()
 
         # Round numerical attributes to 5 decimal places
         n = 5
         self.attributes = {key: round(value, n) if isinstance(value, float) else value for key, value in self.attributes.items()}
+        if cache_key is not None and not failed and memo.finite(self.attributes):
+            memo.caches['GasFraction'].put(cache_key, dict(self.attributes))
 
     def resolve_dependencies(self):
-        resolved = set([attr for attr, value in self.attributes.items() if value is not None])
-
-        # Calculate _sg_liq from mw if mw is provided but _sg_liq is not
-        if 'mw' in self.attributes and self.attributes['mw'] is not None and '_sg_liq' not in resolved:
-            try:
-                self.attributes['_sg_liq'] = newton(lambda sg_liq: correlations.mw_sg_liq(self.attributes['mw'], sg_liq), x0=self.get_initial_guess('_sg_liq'))
-                resolved.add('_sg_liq')
-            except RuntimeError as e:
-                print("Error in calculating _sg_liq from mw: {}".format(e))
-                return
-
-        # Resolve other dependencies
-        while len(resolved) < len(self.attributes):
-            resolved_this_iteration = False
-            for correlation_func, variables in self.correlations.items():
-                unresolved_vars = [var for var in variables if var not in resolved]
-                if len(unresolved_vars) == 1:
-                    unresolved_var = unresolved_vars[0]
-                    resolved_vars = [self.attributes[var] for var in variables if var in resolved]
-                    try:
-                        self.attributes[unresolved_var] = newton(lambda x: correlation_func(*self.prepare_args(correlation_func, x, resolved_vars)), x0=self.get_initial_guess(unresolved_var))
-                        resolved.add(unresolved_var)
-                        resolved_this_iteration = True
-                    except RuntimeError as e:
-                        print("Error in calculating {}: {}".format(unresolved_var, e))
-                        return
-
-            if not resolved_this_iteration:
-                break
-
-    def prepare_args(self, correlation_func, x, resolved_vars):
-        arg_order = self.correlations[correlation_func]
-        args = []
-        for arg in arg_order:
-            if arg in self.attributes and self.attributes[arg] is not None:
-                args.append(self.attributes[arg])
-            else:
-                args.append(x)
-        return args
-
-    def get_initial_guess(self, variable):
+        """
+        :return: True if a solve failed and the resolution was aborted
+        """
+        from scipy.optimize import newton
+        return self._resolve(self.attributes, newton)
+
+    @classmethod
+    def _resolve(cls, attributes, solver):
+        """
+        :param attributes: dictionary of attributes. Values are either scalars, or equal-length arrays (batch mode)
+        :param solver: root finder with the signature of scipy's newton. Raises RuntimeError on failure.
+        :return: True if a solve failed and the resolution was aborted
+        """
+        provided = [attr for attr, value in attributes.items() if value is not None]
+
+        failed = False
+        with instrumentation.stage('correlation_solve'):
+            for correlation_func, variables, unknown in cls.solve_planner.plan(provided):
+                try:
+                    attributes[unknown] = correlations.solve(correlation_func, [attributes[var] for var in variables], x0=cls.get_initial_guess(unknown), solver=solver)
+                except RuntimeError as e:
+                    print("Error in calculating {}: {}".format(unknown, e))
+                    failed = True
+                    break
+        if instrumentation.enabled:
+            instrumentation.record_plan('GasFraction', [attr for attr in provided if attr != 'phase'], failed)
+        return failed
+
+    @staticmethod
+    def get_initial_guess(variable):
         initial_guesses = {'mw': 100, 'api': 30, 'sg_liq': 0.8, 'sg_gas': 0.6, 'Tb': 300, 'ghv': 3000, 'nhv': 3000}
         return initial_guesses.get(variable, 1.0)
 
 
+def resolve_gas_fractions(samples):
+    """
+    Batch version of GasFraction. Rows sharing the same set of known attributes are resolved together with one
+    vectorized solve per correlation, instead of one GasFraction object per row.
+
+    :param samples: pandas DataFrame, or dictionary of equal-length array-likes, keyed by the keyword arguments of
+        GasFraction (mw, sg, VABP, ghv, nhv, Pc, Tc, omega, Tb). Missing values are None or nan.
+    :return: resolved attributes in the same container type as the input (DataFrame with the same index, or dictionary of
+        arrays), keyed like GasFraction.attributes. Values are rounded to 5 decimal places, as in GasFraction. Rows that
+        failed to converge are left as nan.
+    """
+    keyword_to_attribute = {'mw': 'mw', 'sg': 'sg_gas', 'VABP': 'VABP', 'ghv': 'ghv', 'nhv': 'nhv', 'Pc': 'Pc', 'Tc': 'Tc', 'omega': 'omega', 'Tb': 'Tb'}
+    attribute_names = list(keyword_to_attribute.values()) + ['_sg_liq']
+
+    n = len(samples[next(iter(samples.keys()))]) if len(samples) > 0 else 0
+    columns = {attr: np.full(n, np.nan) for attr in attribute_names}
+    for key in samples.keys():
+        if key not in keyword_to_attribute:
+            raise ValueError("Unsupported attribute '{}'. Available attributes are {}".format(key, list(keyword_to_attribute.keys())))
+        columns[keyword_to_attribute[key]] = np.array(samples[key], dtype=np.float64)
+
+    resolve_columns(columns, _resolve_rows)
+
+    columns = {attr: np.round(value, 5) for attr, value in columns.items()}
+    if _is_dataframe(samples):
+        import pandas as pd
+        return pd.DataFrame(columns, index=samples.index)
+    return columns
+
+
+def resolve_gas_fraction_records(records):
+    """
+    Batch version of GasFraction that resolves a records array (see records.py) in place, writing the results directly
+    into its fields. API is filled in from the resolved sg_liq.
+
+    :param records: records array, with nan for the unknowns. Ex: records_from_columns(ghv=ghvs)
+    :return: records, resolved and rounded to 5 decimal places. Rows that failed to converge are left as nan.
+    """
+    n = len(records)
+    columns = {
+        'mw': records['mw'],
+        'sg_gas': records['sg_gas'],
+        'VABP': np.full(n, np.nan),  # not stored in records
+        'ghv': records['ghv'],
+        'nhv': np.full(n, np.nan),  # not stored in records
+        'Pc': records['Pc'],
+        'Tc': records['Tc'],
+        'omega': records['omega'],
+        'Tb': records['Tb'],
+        '_sg_liq': records['sg_liq'],
+    }
+    resolve_columns(columns, _resolve_rows)
+
+    API = records['API']
+    missing = np.isnan(API)
+    API[missing] = correlations.registry[correlations.API_sg_liq]['inverse']['API'](records['sg_liq'][missing])
+    for field in FIELDS:
+        np.round(records[field], 5, out=records[field])
+    return records
+
+
+def _resolve_rows(attributes):
+    GasFraction._resolve(attributes, _newton_rows)
+
+
+def _is_dataframe(samples):
+    # Without importing pandas, which is only needed when the input already is a DataFrame
+    pd = sys.modules.get('pandas')
+    return pd is not None and isinstance(samples, pd.DataFrame)
+
+
+def _newton_rows(func, x0, **kwargs):
+    """
+    Vectorized newton over the rows of a batch, started from the same initial guess. Rows that fail to converge are set
+    to nan rather than failing the whole batch. Keyword arguments (fprime, fprime2) are passed on to newton.
+    """
+    from scipy.optimize import newton
+
+    n = np.size(func(x0))
+    x0 = np.full(n, x0, dtype=np.float64)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        try:
+            if n == 1:
+                root, converged = np.atleast_1d(newton(func, x0=x0, **kwargs)), np.ones(1, dtype=bool)
+            else:
+                root, converged, _ = newton(func, x0=x0, full_output=True, **kwargs)
+        except RuntimeError:
+            root, converged = np.full(n, np.nan), np.zeros(n, dtype=bool)
 
+    if not converged.all():
+        print("Error in batch calculation: {} of {} rows failed to converge.".format(np.count_nonzero(~converged), n))
+    return np.where(converged, root, np.nan)
 
-# Example usage
 
-# Example usage
-print('---------------------- gas ------------------------')
-phase = 'gas'
-a = GasFraction(mw=175, sg=None)
-print(a.attributes)
+if __name__ == '__main__':
+    # Example usage
 
-a = GasFraction(mw=None, sg=6.04073)
-print(a.attributes)
+    # Example usage
+    print('---------------------- gas ------------------------')
+    phase = 'gas'
+    a = GasFraction(mw=175, sg=None)
+    print(a.attributes)
 
-a = GasFraction(mw=175.1, sg=6.04)
-print(a.attributes)
+    a = GasFraction(mw=None, sg=6.04073)
+    print(a.attributes)
 
-print('------------ Upton Axis C7+ ------------')
-a = GasFraction(mw=None, sg=3.464)
-print(a.attributes)
+    a = GasFraction(mw=175.1, sg=6.04)
+    print(a.attributes)
 
-a = GasFraction(mw=96.82, sg=None)
-print(a.attributes)
+    print('------------ Upton Axis C7+ ------------')
+    a = GasFraction(mw=None, sg=3.464)
+    print(a.attributes)
 
-a = GasFraction(mw=96.82, sg=3.464)
-print(a.attributes)
+    a = GasFraction(mw=96.82, sg=None)
+    print(a.attributes)
 
-a = GasFraction(ghv=5131)
-print(a.attributes)
+    a = GasFraction(mw=96.82, sg=3.464)
+    print(a.attributes)
 
-a = GasFraction(ghv=7507.1)
-print(a.attributes)
+    a = GasFraction(ghv=5131)
+    print(a.attributes)
 
-print('------------ Upton Axis Whole ------------')
-a = GasFraction(mw=59.44, sg=2.126)
-print(a.attributes)
+    a = GasFraction(ghv=7507.1)
+    print(a.attributes)
 
-print('------------ Brazos Gas ------------')
-a = GasFraction(mw=90.161)
-print(a.attributes)
+    print('------------ Upton Axis Whole ------------')
+    a = GasFraction(mw=59.44, sg=2.126)
+    print(a.attributes)
 
-a = GasFraction(mw=None, sg=3.1228)
-print(a.attributes)
+    print('------------ Brazos Gas ------------')
+    a = GasFraction(mw=90.161)
+    print(a.attributes)
 
-a = GasFraction(mw=90.161, sg=3.1228)
-print(a.attributes)
+    a = GasFraction(mw=None, sg=3.1228)
+    print(a.attributes)
 
-a = GasFraction(sg=1.035)
-print(a.attributes)
+    a = GasFraction(mw=90.161, sg=3.1228)
+    print(a.attributes)
 
-print('------------ Colorado Facility ------------')
-a = GasFraction(sg=1.1)
-print(a.attributes)
+    a = GasFraction(sg=1.035)
+    print(a.attributes)
 
-print('------------ Shamrock ------------')
-a = GasFraction(sg=3.01810, mw=87.665)
-print(a.attributes)
+    print('------------ Colorado Facility ------------')
+    a = GasFraction(sg=1.1)
+    print(a.attributes)
 
+    print('------------ Shamrock ------------')
+    a = GasFraction(sg=3.01810, mw=87.665)
+    print(a.attributes)
 
-print('------------ Test ------------')
-a = GasFraction(sg=0.5537)
-print(a.attributes)
 
+    print('------------ Test ------------')
+    a = GasFraction(sg=0.5537)
+    print(a.attributes)
 
 
 """
@@ -0,0 +1,71 @@
+"""
+Cold-start benchmark of the entry points. Each module is imported in a fresh interpreter, and the import fails the
+benchmark if it takes longer than its budget, or if it loads a heavy dependency that is only needed on first use.
+
+Usage: python benchmarks/import_time.py [--repeat 5]
+Exit status is 1 when a module is over its budget.
+"""
+import os
+import sys
+import argparse
+import subprocess
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Cumulative import time budgets (ms). numpy alone takes about 100 ms.
+budgets = {
+    'config': 50,
+    'correlations': 250,
+    'GasFraction': 250,
+    'pseudocompound': 250,
+    'utilities': 300,
+    'ghv_solver': 300,  # the heating value path
+}
+
+# Loaded on first use only
+heavy_modules = ['pandas', 'scipy', 'thermo', 'chemicals', 'fluids', 'pint']
+
+
+def import_time(module):
+    """
+    :return: (cumulative import time of module (ms), heavy modules loaded by the import)
+    """
+    code = "import sys, {0}; print(','.join(m for m in {1!r} if m in sys.modules))".format(module, heavy_modules)
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=ROOT, capture_output=True, text=True, check=True)
+
+    # -X importtime writes one "import time: self | cumulative | name" line per module to stderr
+    cumulative = None
+    for line in result.stderr.splitlines():
+        fields = [field.strip() for field in line.split('|')]
+        if len(fields) == 3 and fields[2] == module:
+            cumulative = int(fields[1]) / 1000
+    loaded = [name for name in result.stdout.strip().split(',') if name]
+    return cumulative, loaded
+
+
+def run(repeat=5):
+    """
+    :return: {module: (best import time (ms), budget (ms), heavy modules loaded)}
+    """
+    results = {}
+    for module, budget in budgets.items():
+        times, loaded = [], []
+        for _ in range(repeat):
+            cumulative, loaded = import_time(module)
+            times.append(cumulative)
+        results[module] = (min(times), budget, loaded)
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5, help='imports per module. The fastest one is kept.')
+    args = parser.parse_args()
+
+    failed = False
+    for module, (best, budget, loaded) in run(args.repeat).items():
+        ok = best <= budget and not loaded
+        failed = failed or not ok
+        print('%-16s %7.1f ms  (budget %4d ms)  %s%s' % (module, best, budget, 'ok' if ok else 'FAIL', '  loads ' + ', '.join(loaded) if loaded else ''))
+    sys.exit(1 if failed else 0)
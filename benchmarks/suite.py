@@ -0,0 +1,279 @@
+"""
+Benchmark suite of the hot paths: fraction characterization (scalar vs. batch), pure component heating values, single
+flashes, flash sweeps and full phase envelopes, on the bundled sample compositions and fixed, seeded inputs.
+
+Every case is timed with timeit, repeated, and its best and median time per call are written to a JSON file. Given a
+saved baseline, the cases whose median got slower than the threshold are reported as regressions. The memo caches are
+disabled while timing, as every loop repeats the same inputs. The *_memo cases time the cached runs.
+
+Usage:
+    python benchmarks/suite.py --output baseline.json
+    python benchmarks/suite.py --baseline baseline.json --threshold 0.2
+Exit status is 1 when a case regressed.
+"""
+import os
+import sys
+import json
+import time
+import timeit
+import platform
+import argparse
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import numpy as np
+
+
+cases = {}
+
+
+def case(name):
+    """
+    Registers a benchmark case. The decorated function does the setup, untimed, and returns the callable to time.
+    """
+    def decorator(setup):
+        cases[name] = setup
+        return setup
+    return decorator
+
+
+def _samples():
+    from utilities import statecordell, thurmond, combs_vru_discharge, brazos, combs_sep_gas
+    samples = [statecordell, thurmond, combs_vru_discharge, brazos, combs_sep_gas]
+    ghvs = [1721, 1159, 1904, 1320, 1727]
+    return samples, ghvs
+
+
+def _fraction_ghvs(n):
+    # Seeded, so that every run times the same inputs
+    return np.random.default_rng(0).uniform(4200, 5000, n)
+
+
+@case('gas_fraction_scalar_100')
+def _():
+    from GasFraction import GasFraction
+    ghvs = _fraction_ghvs(100).tolist()
+    return lambda: [GasFraction(ghv=ghv) for ghv in ghvs]
+
+
+@case('gas_fraction_scalar_100_memo')
+def _():
+    import memo
+    from GasFraction import GasFraction
+    ghvs = _fraction_ghvs(100).tolist()
+
+    def func():
+        memo.enable()
+        try:
+            return [GasFraction(ghv=ghv) for ghv in ghvs]
+        finally:
+            memo.disable()
+
+    return func
+
+
+@case('gas_fraction_batch_100')
+def _():
+    from GasFraction import resolve_gas_fractions
+    ghvs = _fraction_ghvs(100)
+    return lambda: resolve_gas_fractions({'ghv': ghvs})
+
+
+@case('gas_fraction_batch_10000')
+def _():
+    from GasFraction import resolve_gas_fractions
+    ghvs = _fraction_ghvs(10000)
+    return lambda: resolve_gas_fractions({'ghv': ghvs})
+
+
+@case('gas_fraction_batch_10000_surrogates')
+def _():
+    import surrogates
+    from GasFraction import resolve_gas_fractions
+    ghvs = _fraction_ghvs(10000)
+
+    def func():
+        surrogates.enable()
+        try:
+            return resolve_gas_fractions({'ghv': ghvs})
+        finally:
+            surrogates.disable()
+
+    surrogates.tables[('Tb_mw_sg', 'Tb')].load()  # build or load the table outside of the timing
+    return func
+
+
+@case('ghvs_pure_compounds')
+def _():
+    import constants_cache
+    from gpa_table import get_GPA_table
+    from utilities import get_ghvs_pure_compounds, is_fraction
+
+    table = get_GPA_table()
+    constants = [constants_cache.constants_from_IDs([c for c in sample if not is_fraction(c)]) for sample in _samples()[0]]
+    return lambda: [get_ghvs_pure_compounds(c, table) for c in constants]
+
+
+@case('solve_fraction_ghvs_5')
+def _():
+    from ghv_solver import solve_fraction_ghvs
+    from composition import Composition
+
+    samples, ghvs = _samples()
+    composition = Composition.from_dicts(samples)
+    composition.normalize()
+    return lambda: solve_fraction_ghvs(composition.components, composition.zs, ghvs)
+
+
+@case('psats_wilson_ks_10000_T')
+def _():
+    from vapor_pressure import get_vapor_pressures
+    from utilities import statecordell, is_fraction
+
+    vapor_pressures = get_vapor_pressures([c for c in statecordell if not is_fraction(c)])
+    Ts = np.linspace(150, 400, 10000)
+    return lambda: (vapor_pressures.Psats(Ts), vapor_pressures.wilson_Ks(Ts, 2e6))
+
+
+@case('flash_single_cold')
+def _():
+    from flash_engine import FlashEngine
+    from utilities import statecordell, is_fraction, normalize_composition
+
+    pure = normalize_composition({c: v for c, v in statecordell.items() if not is_fraction(c)})
+    engine = FlashEngine(list(pure))
+    zs = list(pure.values())
+    return lambda: engine.flash(250.0, 2e6, zs, warm_start=False)
+
+
+def _flash_sweep(warm_start):
+    from flash_engine import FlashEngine
+    from utilities import statecordell, is_fraction, normalize_composition
+
+    pure = normalize_composition({c: v for c, v in statecordell.items() if not is_fraction(c)})
+    engine = FlashEngine(list(pure))
+    zs = list(pure.values())
+    Ts = np.linspace(200.0, 380.0, 40)  # 3 MPa isobar, out of the envelope past about 320 K
+
+    def sweep():
+        engine.last_two_phase = None
+        return engine.flash_many(Ts, 3e6, zs, warm_start=warm_start)
+    return sweep
+
+
+@case('flash_sweep_cold')
+def _():
+    return _flash_sweep(warm_start=False)
+
+
+@case('flash_sweep_warm')
+def _():
+    return _flash_sweep(warm_start=True)
+
+
+@case('envelope_pure_statecordell')
+def _():
+    from phase_envelope import PhaseEnvelope
+    from utilities import statecordell, is_fraction, normalize_composition
+
+    pure = normalize_composition({c: v for c, v in statecordell.items() if not is_fraction(c)})
+    PhaseEnvelope.from_IDs(list(pure), list(pure.values()))  # warm the constants and kij caches
+    return lambda: PhaseEnvelope.from_IDs(list(pure), list(pure.values()))
+
+
+@case('envelopes_with_fraction_5')
+def _():
+    from envelope_batch import trace_envelopes
+    samples, ghvs = _samples()
+    trace_envelopes(samples, ghvs, max_workers=1)
+    return lambda: trace_envelopes(samples, ghvs, max_workers=1)
+
+
+def run(names=None, repeat=5, min_time=0.2):
+    """
+    :param names: cases to run. All by default.
+    :param repeat: number of timed repeats. Each repeat runs as many loops as needed to last min_time.
+    :return: {case: {'best': s, 'median': s, 'loops': n, 'repeat': n}}, times per call
+    """
+    import memo
+
+    results = {}
+    was_enabled = memo.enabled
+    memo.disable()
+    try:
+        for name in names or cases:
+            memo.clear()
+            func = cases[name]()
+            timer = timeit.Timer(func)
+            loops = 1
+            while loops * _time_once(timer) < min_time and loops < 1e6:
+                loops *= 10
+            times = np.array(timer.repeat(repeat=repeat, number=loops)) / loops
+            results[name] = {'best': float(times.min()), 'median': float(np.median(times)), 'loops': loops, 'repeat': repeat}
+    finally:
+        if was_enabled:
+            memo.enable()
+    return results
+
+
+def _time_once(timer):
+    return max(timer.timeit(number=1), 1e-9)
+
+
+def compare(results, baseline, threshold=0.2):
+    """
+    :param threshold: relative slow-down of the median above which a case is a regression. Ex: 0.2 for 20 %
+    :return: {case: median / baseline median}, and the list of regressed cases
+    """
+    ratios, regressions = {}, []
+    for name, result in results.items():
+        if name in baseline:
+            ratios[name] = result['median'] / baseline[name]['median']
+            if ratios[name] > 1 + threshold:
+                regressions.append(name)
+    return ratios, regressions
+
+
+def metadata():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = None
+    return {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'commit': commit or None,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'processor': platform.processor(),
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--output', help='JSON file of the results')
+    parser.add_argument('--baseline', help='JSON file of saved results to compare against')
+    parser.add_argument('--threshold', type=float, default=0.2, help='relative slow-down reported as a regression')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--filter', default='', help='only run the cases whose name contains this string')
+    args = parser.parse_args()
+
+    names = [name for name in cases if args.filter in name]
+    results = run(names, repeat=args.repeat)
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+    ratios, regressions = compare(results, baseline, args.threshold)
+
+    for name, result in results.items():
+        ratio = ' %6.2fx baseline%s' % (ratios[name], '  REGRESSION' if name in regressions else '') if name in ratios else ''
+        print('%-28s best %10.3f ms  median %10.3f ms%s' % (name, 1e3 * result['best'], 1e3 * result['median'], ratio))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'metadata': metadata(), 'results': results}, f, indent=2)
+    sys.exit(1 if regressions else 0)
@@ -0,0 +1,202 @@
+"""
+Critical properties, acentric factors and boiling points of petroleum pseudo-components, for whole arrays of (mw, sg_liq)
+at once. Every method returns a boolean mask along with its results, True where the inputs are within the working range
+of the correlation.
+
+Units: Tb, Tc (K), Pc (Pa)
+"""
+import numpy as np
+import correlations
+
+
+P_ATM = 101325.0  # Pa
+
+working_ranges = {
+    'pedersen': {'mw': (84, 1100)},  # C7 ~ C80
+    'riazi_daubert': {'Tb': (300, 850)},
+    'Tb_mw_sg': {'mw': (70, 700), 'Tb': (300, 850)},
+    'lee_kesler': {'Tbr': (0, 0.8)},
+}
+
+
+def get_eos_constants(eos):
+    """
+    source: Pedersen, K. S., Christensen, P. L.: "Phase Behavior of Petroleum Reservoir Fluids," (2007), Table 5.3
+    notes: coefficients of Tc (c), Pc (d) and the m-factor (e) correlations with mw and sg_liq, and of the m-factor
+        with the acentric factor (w). w1_, w2_, w3_ are for the 1978 version of PR, used when omega > 0.49.
+    """
+    constants_srk = {
+        "c1": 1.6312e2, "c2": 8.6052e1, "c3": 4.3475e-1, "c4": -1.8774e3,
+        "d1": -1.3408e-1, "d2": 2.5019, "d3": 2.0846e2, "d4": -3.9872e3, "d5": 1.0,
+        "e1": 7.4310e-1, "e2": 4.8122e-3, "e3": 9.6707e-3, "e4": -3.7184e-6,
+        "w1": 0.480, "w2": 1.574, "w3": 0.176,
+    }
+    constants_pr = {
+        "c1": 7.34043e1, "c2": 9.73562e1, "c3": 6.18744e-1, "c4": -2.05932e3,
+        "d1": 7.28462e-2, "d2": 2.18811, "d3": 1.63910e2, "d4": -4.04323e3, "d5": 0.25,
+        "e1": 3.73765e-1, "e2": 5.49269e-3, "e3": 1.17934e-2, "e4": -4.93049e-6,
+        "w1": 0.37464, "w2": 1.54226, "w3": 0.26992,
+        "w1_": 0.379642, "w2_": 1.48503, "w3_": 0.164423, "w4_": 0.016666,
+    }
+    if eos == 'PR':
+        return constants_pr
+    elif eos == 'SRK':
+        return constants_srk
+    else:
+        raise ValueError("Unsupported EOS. Pick either PR or SRK")
+
+
+def pedersen(mw, sg_liq, eos='PR'):
+    """
+    source: Pedersen, K. S., Christensen, P. L.: "Phase Behavior of Petroleum Reservoir Fluids," (2007), eq 5.11-5.13
+    notes: EOS-specific Tc, Pc and m-factor of C7+ fractions. The acentric factor is backed out of the m-factor.
+    working range: C7 ~ C80
+
+    :return: (Tc, Pc, omega, valid)
+    """
+    mw, sg_liq = _as_arrays(mw, sg_liq)
+    c = get_eos_constants(eos)
+
+    Tc = c['c1'] * sg_liq + c['c2'] * np.log(mw) + c['c3'] * mw + c['c4'] / mw
+    Pc = np.exp(c['d1'] + c['d2'] * sg_liq**c['d5'] + c['d3'] / mw + c['d4'] / mw**2) * P_ATM
+    m = c['e1'] + c['e2'] * mw + c['e3'] * sg_liq + c['e4'] * mw**2
+    omega, valid = omega_from_m(m, eos)
+
+    return Tc, Pc, omega, valid & _in_range('pedersen', mw=mw)
+
+
+def omega_from_m(m, eos='PR'):
+    """
+    Inverts the m-factor vs. acentric factor relation, m = w1 + w2 * omega - w3 * omega**2, at its smaller root. For PR
+    above omega = 0.49, the 1978 cubic m = w1_ + w2_ * omega - w3_ * omega**2 + w4_ * omega**3 is solved instead.
+
+    :return: (omega, valid). valid is False where m has no solution.
+    """
+    m = np.asarray(m, dtype=np.float64)
+    c = get_eos_constants(eos)
+
+    with np.errstate(invalid='ignore'):
+        omega = (c['w2'] - np.sqrt(c['w2']**2 - 4 * c['w3'] * (m - c['w1']))) / (2 * c['w3'])
+
+    if eos == 'PR':
+        heavy = omega > 0.49
+        if np.any(heavy):
+            omega_heavy = _newton_array(lambda w: c['w1_'] + c['w2_'] * w - c['w3_'] * w**2 + c['w4_'] * w**3 - m,
+                                        lambda w: c['w2_'] - 2 * c['w3_'] * w + 3 * c['w4_'] * w**2, omega)
+            omega = np.where(heavy, omega_heavy, omega)
+
+    return omega, np.isfinite(omega)
+
+
+def riazi_daubert(Tb, sg_liq):
+    """
+    source: [1] (eq 2.63, 2.64)
+    notes: Tc and Pc from the normal boiling point and liquid specific gravity
+    working range: mw 70~700, Tb 300~850K
+
+    :return: (Tc, Pc, valid)
+    """
+    Tb, sg_liq = _as_arrays(Tb, sg_liq)
+
+    Tc = 9.5233 * np.exp(-9.314e-4 * Tb - 0.544442 * sg_liq + 6.4791e-4 * Tb * sg_liq) * Tb**0.81067 * sg_liq**0.53691
+    Pc = 3.1958e5 * np.exp(-8.505e-3 * Tb - 4.8014 * sg_liq + 5.749e-3 * Tb * sg_liq) * Tb**-0.4844 * sg_liq**4.0846 * 1e5  # bar to Pa
+
+    return Tc, Pc, _in_range('riazi_daubert', Tb=Tb)
+
+
+def lee_kesler_omega(Tb, Tc, Pc):
+    """
+    source: Lee, B. I., Kesler, M. G.: AIChE Journal 21 (1975) 510-527, the Lee-Kesler vapor pressure equation at the
+        normal boiling point, solved for omega
+    working range: Tb / Tc < 0.8
+
+    :return: (omega, valid)
+    """
+    Tb, Tc, Pc = _as_arrays(Tb, Tc, Pc)
+    Tbr = Tb / Tc
+
+    f0 = 5.92714 - 6.09648 / Tbr - 1.28862 * np.log(Tbr) + 0.169347 * Tbr**6
+    f1 = 15.2518 - 15.6875 / Tbr - 13.4721 * np.log(Tbr) + 0.43577 * Tbr**6
+    omega = (np.log(P_ATM / Pc) - f0) / f1
+
+    return omega, _in_range('lee_kesler', Tbr=Tbr)
+
+
+def edmister_omega(Tb, Tc, Pc):
+    """
+    source: Edmister, W. C.: Petroleum Refiner 37 (1958) 173-179
+    notes: simpler and less accurate than Lee-Kesler
+    working range: Tb < Tc
+
+    :return: (omega, valid)
+    """
+    Tb, Tc, Pc = _as_arrays(Tb, Tc, Pc)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        omega = 3 / 7 * np.log10(Pc / P_ATM) / (Tc / Tb - 1) - 1
+    return omega, (Tb < Tc) & np.isfinite(omega)
+
+
+def Tb_from_mw_sg(mw, sg_liq):
+    """
+    Inverts correlations.Tb_mw_sg, the mw correlation also used by GasFraction and PseudoComponent, with one vectorized
+    Newton solve started from the explicit estimate of [1] (eq 2.56).
+    working range: mw 70~700, Tb 300~850K
+
+    :return: (Tb, valid)
+    """
+    mw, sg_liq = _as_arrays(mw, sg_liq)
+    x0 = 3.76587 * np.exp(3.7741e-3 * mw + 2.98404 * sg_liq - 4.25288e-3 * mw * sg_liq) * mw**0.40167 * sg_liq**-1.58262
+    fprime = correlations.registry[correlations.Tb_mw_sg]['fprime']['Tb']
+    Tb = _newton_array(lambda Tb: correlations.Tb_mw_sg(Tb, mw, sg_liq), lambda Tb: fprime(Tb, mw, sg_liq), x0)
+
+    return Tb, np.isfinite(Tb) & _in_range('Tb_mw_sg', mw=mw, Tb=Tb)
+
+
+def characterize(mw, sg_liq, eos='PR', method='pedersen'):
+    """
+    Fills Tb, Tc, Pc and omega for arrays of pseudo-components.
+
+    :param method: 'pedersen' for the EOS-specific Tc, Pc and omega of Pedersen, or 'riazi_daubert' for the Riazi-Daubert
+        Tc and Pc from Tb, with the Lee-Kesler omega.
+    :return: dictionary of {'Tb', 'Tc', 'Pc', 'omega', 'valid'} arrays. valid is True where every correlation used is
+        within its working range.
+    """
+    Tb, valid = Tb_from_mw_sg(mw, sg_liq)
+
+    if method == 'pedersen':
+        Tc, Pc, omega, valid_pedersen = pedersen(mw, sg_liq, eos)
+        valid = valid & valid_pedersen
+    elif method == 'riazi_daubert':
+        Tc, Pc, valid_riazi = riazi_daubert(Tb, sg_liq)
+        omega, valid_omega = lee_kesler_omega(Tb, Tc, Pc)
+        valid = valid & valid_riazi & valid_omega
+    else:
+        raise ValueError("Unsupported method '%s'. Pick either 'pedersen' or 'riazi_daubert'" % method)
+
+    return {'Tb': Tb, 'Tc': Tc, 'Pc': Pc, 'omega': omega, 'valid': valid}
+
+
+def _as_arrays(*values):
+    return [np.asarray(value, dtype=np.float64) for value in values]
+
+
+def _in_range(method, **values):
+    valid = True
+    for key, (lower, upper) in working_ranges[method].items():
+        valid = valid & (values[key] >= lower) & (values[key] <= upper)
+    return np.asarray(valid)
+
+
+def _newton_array(func, fprime, x0, maxiter=50, rtol=1e-10):
+    """
+    Element-wise Newton iterations over a whole array. Elements that do not converge are set to nan.
+    """
+    x = np.array(x0, dtype=np.float64)
+    step = np.full(x.shape, np.inf)
+    with np.errstate(invalid='ignore', divide='ignore', over='ignore'):
+        for _ in range(maxiter):
+            step = func(x) / fprime(x)
+            x = x - step
+            if not np.any(np.abs(step) > rtol * np.abs(x)):
+                break
+        return np.where(np.abs(step) <= rtol * np.abs(x), x, np.nan)
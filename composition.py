@@ -0,0 +1,168 @@
+"""
+Compositions of many gas analyses as one (n_samples, n_components) float64 array with a component index, instead of one
+dictionary per sample.
+"""
+import numpy as np
+
+
+MAX_CLOSURE_CORRECTIONS = 16
+
+
+class Composition(object):
+
+    def __init__(self, components, zs, ids=None):
+        """
+        :param components: component names of the columns of zs. Ex: ['nitrogen', 'methane', ..., 'fractions']
+        :param zs: (n_samples, n_components) mole fractions or mol %. nan marks missing entries.
+        :param ids: sample ids. Row numbers by default.
+        """
+        self.components = list(components)
+        self.index = {component: j for j, component in enumerate(self.components)}
+        if len(self.index) != len(self.components):
+            raise ValueError("Duplicate components in %s" % self.components)
+
+        self.zs = np.array(zs, dtype=np.float64, ndmin=2, order='C')
+        if self.zs.shape[1] != len(self.components):
+            raise ValueError("Got %d columns for %d components." % (self.zs.shape[1], len(self.components)))
+        self.ids = np.arange(len(self.zs)) if ids is None else np.asarray(ids)
+        if len(self.ids) != len(self.zs):
+            raise ValueError("Got %d ids for %d samples." % (len(self.ids), len(self.zs)))
+
+    @classmethod
+    def from_dicts(cls, comp_dicts, components=None, ids=None):
+        """
+        :param comp_dicts: list of composition dictionaries. Ex: [statecordell, thurmond]
+        :param components: component index. By default, every component of comp_dicts in order of first appearance.
+            Components missing from a dictionary are 0, and None values are missing entries (nan).
+        """
+        if components is None:
+            components = list(dict.fromkeys(component for comp_dict in comp_dicts for component in comp_dict))
+        index = {component: j for j, component in enumerate(components)}
+
+        zs = np.zeros((len(comp_dicts), len(components)))
+        for i, comp_dict in enumerate(comp_dicts):
+            for component, value in comp_dict.items():
+                if component not in index:
+                    raise ValueError("Component '%s' of sample %d is not in %s" % (component, i, list(components)))
+                zs[i, index[component]] = np.nan if value is None else value
+        return cls(components, zs, ids)
+
+    def to_dicts(self):
+        """
+        :return: list of composition dictionaries, one per sample, in the order of the component index
+        """
+        return [dict(zip(self.components, row)) for row in self.zs.tolist()]
+
+    def __len__(self):
+        return len(self.zs)
+
+    def __getitem__(self, component):
+        """
+        :return: column of a component, as a view
+        """
+        return self.zs[:, self.index[component]]
+
+    @property
+    def missing(self):
+        """
+        :return: (n_samples, n_components) mask, True where the entry is missing (nan)
+        """
+        return np.isnan(self.zs)
+
+    @property
+    def negative(self):
+        """
+        :return: (n_samples, n_components) mask, True where the entry is negative
+        """
+        return self.zs < 0
+
+    @property
+    def valid(self):
+        """
+        :return: (n_samples,) mask, True for the samples without missing or negative entries that sum to more than 0
+        """
+        with np.errstate(invalid='ignore'):
+            return ~np.any(self.missing | self.negative, axis=1) & (self.zs.sum(axis=1) > 0)
+
+    def normalize(self):
+        """
+        Normalizes the valid samples in place. See normalize_rows().
+
+        :return: (n_samples,) mask of the normalized samples
+        """
+        valid = self.valid
+        normalize_rows(self.zs, np.flatnonzero(valid))
+        return valid
+
+
+def normalize_rows(zs, rows=None):
+    """
+    Normalizes rows of a composition matrix in place, like utilities.normalize_composition() does for one dictionary: the
+    last non-zero component of each row takes up the rounding, so that each row sums to exactly 1 with zs.sum(axis=1).
+    Where numpy's pairwise summation skips over 1 for every value of it, the previous non-zero component does.
+
+    :param zs: (n_samples, n_components) float64 array, modified in place
+    :param rows: indices of the rows to normalize. All rows by default. Rows summing to 0 are left as is.
+    """
+    if rows is None:
+        rows = np.flatnonzero(zs.sum(axis=1) > 0)
+    else:
+        rows = np.asarray(rows, dtype=np.intp)
+        rows = rows[zs[rows].sum(axis=1) > 0]
+    if len(rows) == 0:
+        return
+
+    every_row = len(rows) == len(zs)
+    block = zs if every_row else zs[rows]  # a view when every row is normalized, else a copy written back below
+    block /= block.sum(axis=1, keepdims=True)
+    last = block.shape[1] - 1 - np.argmax(block[:, ::-1] != 0, axis=1)
+    index = np.arange(len(rows))
+    block[index, last] = 0
+    block[index, last] = 1 - block.sum(axis=1)
+
+    # numpy sums pairwise, not in column order, so the closing element is not added last and a row can still be an ulp
+    # of 1 off. Correct it against the same sum. Where no value of the last non-zero element makes the sum exactly 1,
+    # the previous non-zero element closes the row instead.
+    off, closing = index, last
+    while len(off):
+        off, closing = off[closing >= 0], closing[closing >= 0]
+        off, closing = _close(block, off, closing)
+        nonzero_before = (block[off] != 0) & (np.arange(block.shape[1]) < closing[:, None])
+        closing = block.shape[1] - 1 - np.argmax(nonzero_before[:, ::-1], axis=1)
+        closing[~nonzero_before.any(axis=1)] = -1
+    if not every_row:
+        zs[rows] = block
+
+
+
+def _close(block, rows, columns):
+    """
+    Corrects block[rows, columns] until block[rows].sum(axis=1) is exactly 1. An ulp of 1 can be many ulps of the
+    corrected element, so the correction is halved at every pass, and is at least one ulp of the element.
+
+    :return: (rows, columns) that are still off
+    """
+    for correction in range(MAX_CLOSURE_CORRECTIONS):
+        error = 1 - block[rows].sum(axis=1)
+        off = error != 0
+        rows, columns, error = rows[off], columns[off], error[off]
+        if len(rows) == 0:
+            break
+        value = block[rows, columns]
+        corrected = value + error / 2**correction
+        block[rows, columns] = np.where(corrected == value, np.nextafter(value, value + error), corrected)
+    off = block[rows].sum(axis=1) != 1
+    return rows[off], columns[off]
+
+if __name__ == '__main__':
+    from utilities import statecordell, thurmond, combs_vru_discharge, brazos, combs_sep_gas
+    import timeit
+
+    composition = Composition.from_dicts([statecordell, thurmond, combs_vru_discharge, brazos, combs_sep_gas] * 20000)
+    composition.zs[1, 0] = np.nan
+    composition.zs[2, 1] = -0.1
+
+    start_time = timeit.default_timer()
+    normalized = composition.normalize()
+    print('%d samples normalized in %.4f s' % (len(composition), timeit.default_timer() - start_time))
+    print(normalized[:5], np.all(composition.zs[normalized].sum(axis=1) == 1))
@@ -1,5 +1,3 @@
-from fluids.constants import R
-
 # Configuration dictionary with default values
 constants = {
     "T_STANDARD": 288.7056,  # Temperature in Kelvin
@@ -16,11 +14,66 @@ GPA_table_column_mapping = {
 
 }
 
+version = 0  # incremented by every update_config()
+
+
 def update_config(user_config):
     """
     Update configuration values using a user-provided dictionary.
     :param user_config: A dictionary containing configuration keys and their new values
     """
+    global version
     constants.update(user_config)
+    version += 1
+    settings.invalidate()
+
+
+class Settings(object):
+    """
+    Quantities derived from the constants, computed once on first access and kept as plain float attributes for hot
+    loops. update_config() invalidates them, so they are recomputed from the new constants on the next access. Changes
+    made to the constants dictionary directly, without update_config(), are not tracked.
+
+    Ex: settings.V_MOLAR
+    """
+
+    def __init__(self):
+        self.version = None  # version of the constants the derived quantities were computed from
+
+    def invalidate(self):
+        self.__dict__.clear()
+        self.version = None
+
+    def __getattr__(self, name):
+        # Only called for missing attributes, i.e. before the first access or after invalidate()
+        if name.startswith('__'):
+            raise AttributeError(name)
+        derived = self._derive()
+        if name not in derived:
+            raise AttributeError("'Settings' has no attribute '%s'" % name)
+        self.__dict__.update(derived)
+        self.version = version
+        return derived[name]
+
+    @staticmethod
+    def _derive():
+        import units
+
+        V_molar = constants['R'] * constants['T_STANDARD'] / constants['P_STANDARD']
+        return {
+            'R': float(constants['R']),
+            'T_STANDARD': float(constants['T_STANDARD']),
+            'P_STANDARD': float(constants['P_STANDARD']),
+            'MW_AIR': float(constants['MW_AIR']),
+            'RHO_WATER': float(constants['RHO_WATER']),
+            'V_MOLAR': V_molar,  # ideal gas molar volume at standard conditions, m^3/mol
+            'V_MOLAR_SCF': V_molar * units.factors[('m^3', 'ft^3')],  # scf/mol
+            'GHV_PER_HC': -units.factors[('joule/m^3', 'Btu/ft^3')] / V_molar,  # Btu/scf per J/mol of heat of combustion
+            'SG_GAS_PER_MW': 1 / constants['MW_AIR'],  # sg_gas = mw * SG_GAS_PER_MW
+            'SG_LIQ_PER_RHO': 1 / constants['RHO_WATER'],  # sg_liq = rhol_60F_mass (kg/m^3) * SG_LIQ_PER_RHO
+        }
+
+
+settings = Settings()
 
 
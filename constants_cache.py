@@ -0,0 +1,99 @@
+"""
+Two-layer cache for thermo's ChemicalConstantsPackage (and PropertyCorrelationsPackage) lookups, keyed by the
+normalized component list:
+
+1. in-memory LRU, for repeated mixtures within a process
+2. versioned on-disk store, one JSON file per component set, so that repeat runs skip thermo's name -> CAS resolution
+   and database loading completely
+"""
+import os
+import json
+import hashlib
+import functools
+import instrumentation
+
+
+CACHE_VERSION = 1
+cache_dir = os.path.join(os.path.expanduser('~'), '.cache', 'PhaseEnvelope-py', 'constants')  # None disables the disk layer
+
+
+def normalize_IDs(IDs):
+    """
+    :param IDs: component names or CAS numbers. Ex: ['Methane ', 'ethane']
+    :return: tuple of stripped, lower-case IDs. Ex: ('methane', 'ethane')
+    """
+    return tuple(ID.strip().lower() for ID in IDs)
+
+
+def constants_from_IDs(IDs):
+    """
+    Cached equivalent of ChemicalConstantsPackage.constants_from_IDs(IDs)
+    """
+    with instrumentation.stage('constants'):
+        return _load(normalize_IDs(IDs), False)[0]
+
+
+def from_IDs(IDs):
+    """
+    Cached equivalent of ChemicalConstantsPackage.from_IDs(IDs)
+    :return: (constants, properties)
+    """
+    with instrumentation.stage('constants'):
+        return _load(normalize_IDs(IDs), True)
+
+
+def clear_cache(disk=False):
+    """
+    :param disk: also delete the on-disk store of the current version
+    """
+    _load.cache_clear()
+    if disk and cache_dir is not None and os.path.isdir(_version_dir()):
+        for file in os.listdir(_version_dir()):
+            os.remove(os.path.join(_version_dir(), file))
+
+
+@functools.lru_cache(maxsize=256)
+def _load(IDs, with_properties):
+    from thermo import ChemicalConstantsPackage, PropertyCorrelationsPackage
+
+    path = _cache_path(IDs, with_properties)
+    if path is not None and os.path.isfile(path):
+        try:
+            with open(path) as f:
+                data = json.load(f)
+            constants = ChemicalConstantsPackage.from_json(data['constants'])
+            properties = PropertyCorrelationsPackage.from_json(data['properties']) if with_properties else None
+            return constants, properties
+        except (ValueError, KeyError, TypeError):
+            pass  # corrupted or incompatible file. Rebuild it below.
+
+    if with_properties:
+        constants, properties = ChemicalConstantsPackage.from_IDs(list(IDs))
+    else:
+        constants, properties = ChemicalConstantsPackage.constants_from_IDs(list(IDs)), None
+
+    if path is not None:
+        data = {
+            'IDs': list(IDs),
+            'constants': constants.as_json(),
+            'properties': properties.as_json() if with_properties else None,
+        }
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = '%s.%d.tmp' % (path, os.getpid())
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)  # atomic, so that concurrent processes never read a partial file
+
+    return constants, properties
+
+
+def _version_dir():
+    import thermo
+    return os.path.join(cache_dir, 'v%d-thermo-%s' % (CACHE_VERSION, thermo.__version__))
+
+
+def _cache_path(IDs, with_properties):
+    if cache_dir is None:
+        return None
+    key = hashlib.sha1('\n'.join(IDs).encode('utf-8')).hexdigest()
+    return os.path.join(_version_dir(), '%s%s.json' % (key, '-properties' if with_properties else ''))
@@ -1,5 +1,9 @@
+import inspect
 import numpy as np
 import config
+import instrumentation
+import memo
+import surrogates
 
 
 def Tb_mw(Tb, mw):
@@ -21,7 +25,8 @@ def liq_ghv_sg(ghv, API):
 
 def gas_ghv_sg(ghv, sg):
     """
-    notes: gross heating value (ghv, also known has high heating value) vs. gas specific gravity for fuel gases
+    notes: gross heating value (ghv, also known has high heating value) vs. gas specific gravity for fuel gases. ghv peaks
+        at sg = SG_GAS_GHV_MAX (~5218 Btu/scf) and decreases past it, so higher ghvs have no solution for sg.
     source: [3]
     units: ghv (Btu/scf)
     working range: < 2.0 sg
@@ -33,7 +38,8 @@ def gas_ghv_sg(ghv, sg):
 
 def gas_nhv_sg(nhv, sg):
     """
-    notes: net heating value (nhv, also known has low heating value) vs. gas specific gravity for fuel gases
+    notes: net heating value (nhv, also known has low heating value) vs. gas specific gravity for fuel gases. nhv peaks
+        at sg = SG_GAS_NHV_MAX.
     source: [3]
     units: nhv (Btu/scf)
     """
@@ -69,9 +75,7 @@ def mw_sg_gas(mw, sg_gas):
     source: [1] (eq 2.6)
     notes: valid for all gas
     """
-    sg_air = config.constants['MW_AIR']
-
-    return mw / sg_air - sg_gas
+    return mw * config.settings.SG_GAS_PER_MW - sg_gas
 
 
 def sg_liq(rhol_60F_mass):
@@ -79,7 +83,296 @@ def sg_liq(rhol_60F_mass):
     rhol_60F_mass = Liquid mass densities at 60 °F, [kg/m^3].
     Water liquid density at 60F is assumed to be 999.0170125317171 kg/m^3 by default
     """
-    return rhol_60F_mass / config.constants['RHO_WATER']
+    return rhol_60F_mass * config.settings.SG_LIQ_PER_RHO
+
+# Roots of the derivatives of gas_ghv_sg and gas_nhv_sg, where the heating values peak
+SG_GAS_GHV_MAX = 4.24567
+SG_GAS_NHV_MAX = 4.14509
+
+
+def register(correlation_func, inverse=None, fprime=None, fprime2=None, domain=None):
+    """
+    Records the fast paths of a correlation in the registry. Each dictionary is keyed by the argument name of
+    correlation_func that is being solved for.
+
+    :param inverse: explicit solutions. Called with the remaining arguments, in the same order as correlation_func.
+    :param fprime: analytic first derivatives of the residual. Called with all arguments of correlation_func.
+    :param fprime2: analytic second derivatives of the residual. Called with all arguments of correlation_func.
+    :param domain: (low, high) intervals over which the residual is valid and monotonic in the argument. Solves for the
+        argument are bracketed by it, see solve().
+    """
+    registry[correlation_func] = {
+        'args': list(inspect.signature(correlation_func).parameters.keys()),
+        'inverse': inverse or {},
+        'fprime': fprime or {},
+        'fprime2': fprime2 or {},
+        'domain': domain or {},
+    }
+
+
+def solve(correlation_func, args, x0, solver=None):
+    """
+    Solves a correlation for its one unknown argument. Uses the explicit inverse if one is registered, Halley's method if
+    analytic derivatives are registered, and falls back to the secant method otherwise.
+
+    If a domain is registered for the unknown, a scalar solve whose root finder fails or lands outside of the domain is
+    retried with a bisection-safeguarded Newton's method over the domain, and batches are solved with it directly. A
+    RuntimeError is raised (nan for the rows of a batch) when there is no solution within the domain.
+
+    With surrogates enabled, unknowns that have a lookup table are interpolated instead, see surrogates.py.
+
+    :param args: arguments of correlation_func in order, with None in place of the unknown. Known values are scalars, or
+        equal-length arrays (batch mode).
+    :param x0: initial guess for the unknown
+    :param solver: root finder with the signature of scipy's newton. Raises RuntimeError on failure. scipy's newton by
+        default.
+    :return: value of the unknown argument. Iterative scalar solves are memoized when memo is enabled, see memo.py.
+    """
+    if memo.enabled and correlation_func in registry and all(np.ndim(arg) == 0 for arg in args) and not _is_explicit(correlation_func, args):
+        # Iterative scalar solves of registered correlations only. Batches are already solved in one call, explicit
+        # inverses are cheaper than the lookup, and arbitrary functions (lambdas) have no unique name to key on.
+        name = correlation_func.__module__ + '.' + correlation_func.__qualname__
+        cache_key = (memo.fingerprint(), name, memo.solve_key(*args), memo.solve_key(x0))
+        value = memo.caches['correlations'].get(cache_key)
+        if value is None:
+            value = _solve(correlation_func, args, x0, solver)
+            if memo.finite(value):
+                memo.caches['correlations'].put(cache_key, float(value))
+        return np.float64(value)
+    return _solve(correlation_func, args, x0, solver)
+
+
+def _is_explicit(correlation_func, args):
+    return registry[correlation_func]['args'][[arg is None for arg in args].index(True)] in registry[correlation_func]['inverse']
+
+
+def _solve(correlation_func, args, x0, solver):
+    if solver is None:
+        from scipy.optimize import newton as solver  # scipy takes most of the import time of this module
+    if instrumentation.enabled:
+        solver = _counted(solver, correlation_func.__name__)
+
+    i = [arg is None for arg in args].index(True)
+    entry = registry.get(correlation_func)
+
+    def fill(x):
+        return args[:i] + [x] + args[i + 1:]
+
+    if entry is None:
+        return solver(lambda x: correlation_func(*fill(x)), x0=x0)
+
+    name = entry['args'][i]
+    if name in entry['inverse']:
+        with np.errstate(invalid='ignore', divide='ignore'):
+            value = entry['inverse'][name](*(args[:i] + args[i + 1:]))
+        if instrumentation.enabled:
+            # Rows whose known arguments are not finite already failed upstream
+            defined = np.all([np.isfinite(arg) for arg in args[:i] + args[i + 1:]], axis=0)
+            instrumentation.record_solve(correlation_func.__name__, 0, int(np.count_nonzero(~np.isfinite(value) & defined)))
+        if np.ndim(value) == 0 and not np.isfinite(value):
+            raise RuntimeError("Explicit solution for '{}' is outside of the correlation's working range.".format(name))
+        return value
+
+    if surrogates.enabled:
+        value = surrogates.lookup(correlation_func, name, args)
+        if value is not None:
+            outside = np.isnan(value)
+            if not outside.any():
+                return value[()]
+            if not outside.all():
+                # Rows outside of the table range are solved as usual
+                rows = [arg if arg is None or np.ndim(arg) == 0 else arg[outside] for arg in args]
+                value[outside] = _solve_iterative(correlation_func, entry, rows, i, x0, solver)
+                return value
+
+    return _solve_iterative(correlation_func, entry, args, i, x0, solver)
+
+
+def _solve_iterative(correlation_func, entry, args, i, x0, solver):
+    name = entry['args'][i]
+
+    def fill(x):
+        return args[:i] + [x] + args[i + 1:]
+
+    kwargs = {}
+    if name in entry['fprime']:
+        kwargs['fprime'] = lambda x: entry['fprime'][name](*fill(x))
+    if name in entry['fprime2']:
+        kwargs['fprime2'] = lambda x: entry['fprime2'][name](*fill(x))
+    if name in entry['domain']:
+        return _solve_in_domain(correlation_func, fill, args[:i] + args[i + 1:], name, entry['domain'][name], x0, solver, kwargs, batch=any(np.ndim(arg) > 0 for arg in args))
+    return solver(lambda x: correlation_func(*fill(x)), x0=x0, **kwargs)
+
+
+def _solve_in_domain(correlation_func, fill, known, name, domain, x0, solver, kwargs, batch):
+    low, high = domain
+
+    def func(x):
+        return correlation_func(*fill(x))
+
+    if not batch:
+        try:
+            root = solver(func, x0=x0, **kwargs)
+            if low <= root <= high:
+                return root
+        except RuntimeError:
+            pass
+
+    with np.errstate(invalid='ignore'):
+        shape = np.shape(func(x0))
+    # Rows with nan known arguments stay nan, but already failed upstream
+    defined = np.ones(shape, dtype=bool)
+    for arg in known:
+        defined &= np.isfinite(arg)
+    root, iterations = bracketed_newton(func, low, high, x0=x0, fprime=kwargs.get('fprime'), shape=shape)
+    failures = int(np.count_nonzero(~np.isfinite(root) & defined))
+    if instrumentation.enabled:
+        instrumentation.increment('bracketed_solves')
+        instrumentation.record_solve(correlation_func.__name__, iterations, failures)
+
+    if not batch:
+        if not np.isfinite(root):
+            raise RuntimeError("No solution for '{}' within the correlation's working range [{}, {}].".format(name, low, high))
+        return root[()]
+    if failures:
+        print("Error in batch calculation: {} of {} rows have no solution for '{}' within the correlation's working range [{}, {}].".format(failures, root.size, name, low, high))
+    return root
+
+
+def bracketed_newton(func, low, high, x0=None, fprime=None, shape=(), tol=1.48e-8, maxiter=100):
+    """
+    Newton's method safeguarded by bisection (rtsafe). The root is kept bracketed, and Newton steps that would leave the
+    bracket are replaced by bisection steps, so that it converges whenever func changes sign over [low, high]. Without
+    fprime, it bisects. Vectorized: func is evaluated on whole arrays of the given shape, one independent root per
+    element.
+
+    :param x0: initial guess. The middle of the bracket if None, or if outside of it.
+    :param tol: absolute tolerance on the step, same as scipy's newton
+    :return: roots, nan where func does not change sign over [low, high], and the number of iterations
+    """
+    a = np.full(shape, low, dtype=np.float64)
+    b = np.full(shape, high, dtype=np.float64)
+    with np.errstate(invalid='ignore', divide='ignore', over='ignore'):
+        f_a, f_b = func(a), func(b)
+        bracketed = np.sign(f_a) * np.sign(f_b) <= 0  # False for nan
+
+        # Orient the brackets so that func(a) <= 0 <= func(b)
+        a, b = np.where(f_a > 0, b, a), np.where(f_a > 0, a, b)
+
+        inside = (x0 is not None) and (low < x0 < high)
+        x = np.full(shape, x0, dtype=np.float64) if inside else 0.5 * (a + b)
+        done = ~bracketed
+
+        iterations = 0
+        while not done.all() and iterations < maxiter:
+            iterations += 1
+            f = func(x)
+            a = np.where(f < 0, x, a)
+            b = np.where(f < 0, b, x)
+
+            x_new = 0.5 * (a + b)
+            if fprime is not None:
+                x_newton = x - f / fprime(x)
+                x_new = np.where((x_newton - a) * (x_newton - b) <= 0, x_newton, x_new)
+
+            done = done | (f == 0) | (np.abs(x_new - x) < tol)
+            x = np.where(done, x, x_new)
+
+    return np.where(bracketed, x, np.nan), iterations
+
+
+def _counted(solver, name):
+    """
+    :return: solver that records its residual evaluations and failures in instrumentation
+    """
+    def counted_solver(func, x0, **kwargs):
+        evaluations = [0]
+
+        def counted_func(x):
+            evaluations[0] += 1
+            return func(x)
+
+        try:
+            root = solver(counted_func, x0=x0, **kwargs)
+        except RuntimeError:
+            instrumentation.record_solve(name, evaluations[0], 1)
+            raise
+        instrumentation.record_solve(name, evaluations[0], int(np.count_nonzero(~np.isfinite(root))))
+        return root
+    return counted_solver
+
+
+def _mw_from_Tb_sg_liq(Tb, sg_liq):
+    return 42.965 * (np.exp(2.097e-4 * Tb - 7.78712 * sg_liq + 2.08476e-3 * Tb * sg_liq)) * Tb**1.26007 * sg_liq**4.983098
+
+
+registry = {}
+
+register(
+    Tb_mw,
+    inverse={
+        'mw': lambda Tb: ((6.97996 - np.log(1080 - Tb)) / 0.01964) ** (3/2),
+        'Tb': lambda mw: 1080 - np.exp(6.97996 - 0.01964 * mw ** (2/3)),
+    },
+)
+register(
+    liq_ghv_sg,
+    inverse={'ghv': lambda API: 17721 + 89.08 * API - 0.348 * API**2 + 0.009518 * API**3},
+    fprime={'API': lambda ghv, API: 89.08 - 0.696 * API + 0.028554 * API**2},
+    fprime2={'API': lambda ghv, API: -0.696 + 0.057108 * API},
+    domain={'API': (0, 60)},
+)
+register(
+    gas_ghv_sg,
+    inverse={'ghv': lambda sg: 229.60 + 1321 * sg + 207.97 * sg**2 - 57.084 * sg**3},
+    fprime={'sg': lambda ghv, sg: 1321 + 415.94 * sg - 171.252 * sg**2},
+    fprime2={'sg': lambda ghv, sg: 415.94 - 342.504 * sg},
+    domain={'sg': (0, SG_GAS_GHV_MAX)},
+)
+register(
+    gas_nhv_sg,
+    inverse={'nhv': lambda sg: 186.37 + 1219.3 * sg + 206.93 * sg**2 - 56.936 * sg**3},
+    fprime={'sg': lambda nhv, sg: 1219.3 + 413.86 * sg - 170.808 * sg**2},
+    fprime2={'sg': lambda nhv, sg: 413.86 - 341.616 * sg},
+    domain={'sg': (0, SG_GAS_NHV_MAX)},
+)
+register(
+    Tb_mw_sg,
+    inverse={'mw': _mw_from_Tb_sg_liq},
+    # residual = -mw + g(Tb, sg_liq), where dg/dx = g * h(x), and d2g/dx2 = g * (h(x)**2 + h'(x))
+    fprime={
+        'Tb': lambda Tb, mw, sg_liq: _mw_from_Tb_sg_liq(Tb, sg_liq) * (2.097e-4 + 2.08476e-3 * sg_liq + 1.26007 / Tb),
+        'sg_liq': lambda Tb, mw, sg_liq: _mw_from_Tb_sg_liq(Tb, sg_liq) * (-7.78712 + 2.08476e-3 * Tb + 4.983098 / sg_liq),
+    },
+    fprime2={
+        'Tb': lambda Tb, mw, sg_liq: _mw_from_Tb_sg_liq(Tb, sg_liq) * ((2.097e-4 + 2.08476e-3 * sg_liq + 1.26007 / Tb)**2 - 1.26007 / Tb**2),
+        'sg_liq': lambda Tb, mw, sg_liq: _mw_from_Tb_sg_liq(Tb, sg_liq) * ((-7.78712 + 2.08476e-3 * Tb + 4.983098 / sg_liq)**2 - 4.983098 / sg_liq**2),
+    },
+    # Wider than the documented working range, which light gas fractions fall below. mw increases with Tb for any
+    # sg_liq. It is not monotonic in sg_liq, which has no domain.
+    domain={'Tb': (50, 2000)},
+)
+register(
+    mw_sg_liq,
+    inverse={
+        'mw': lambda sg_liq: ((3.56073 - np.log(1.07 - sg_liq)) / 2.93886) ** 10,
+        'sg_liq': lambda mw: 1.07 - np.exp(3.56073 - 2.93886 * mw ** 0.1),
+    },
+)
+register(
+    API_sg_liq,
+    inverse={
+        'API': lambda sg_liq: 141.5 / sg_liq - 131.5,
+        'sg_liq': lambda API: 141.5 / (API + 131.5),
+    },
+)
+register(
+    mw_sg_gas,
+    inverse={
+        'mw': lambda sg_gas: sg_gas * config.settings.MW_AIR,
+        'sg_gas': lambda mw: mw * config.settings.SG_GAS_PER_MW,
+    },
+)
 
 """
 .. [1] Riazi, M. R.: "Characterization and Properties of Petroleum Fractions," first edition (1985), West Conshohocken, Pennsylvania: ASTM International`
@@ -0,0 +1,145 @@
+"""
+Phase envelopes for many gas analyses, computed in parallel. The analyses are independent, so they are spread over a
+process pool in chunks. Each worker keeps warm caches of the constants of the component sets it sees, and slices the
+kij matrices out of the master matrix of kij_store. Results are returned in the order of the input.
+"""
+import os
+import functools
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+import constants_cache
+import characterization
+import kij_store
+import plus_fraction
+
+
+def trace_envelopes(samples, ghvs=None, n_groups=1, n_plus=6, max_workers=None, chunksize=None, **envelope_kwargs):
+    """
+    :param samples: list of composition dictionaries. Ex: [statecordell, thurmond], with an optional 'fractions' component
+    :param ghvs: measured gross heating values of the whole gas (Btu/scf), one per sample. Required for the samples with a
+        fraction, whose heating value is back-solved from it to characterize the fraction.
+    :param n_groups: number of pseudo-components the fraction is split into. 1 keeps it as a single pseudo-component.
+    :param n_plus: carbon number of the fraction. Ex: 6 for C6+, 7 for C7+ when hexane is reported separately.
+    :param max_workers: number of processes. Defaults to the number of CPUs. 1 runs everything in this process.
+    :param chunksize: number of samples sent to a worker at once. Defaults to about 4 chunks per worker.
+    :param envelope_kwargs: passed to PhaseEnvelope. Ex: P_start=101325.0
+    :return: list of PhaseEnvelope, in the order of samples. None for the samples that failed.
+    """
+    samples = [dict(sample) for sample in samples]
+    if ghvs is None:
+        ghvs = [None] * len(samples)
+    if len(ghvs) != len(samples):
+        raise ValueError("Got %d ghvs for %d samples." % (len(ghvs), len(samples)))
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    max_workers = max(1, min(max_workers, len(samples)))
+    if chunksize is None:
+        chunksize = max(1, len(samples) // (4 * max_workers))
+
+    # Resolve the constants of every distinct component set once here, so that the workers load them from the disk cache
+    # instead of all resolving the same names in thermo at once
+    component_sets = sorted({_pure_components(sample) for sample in samples})
+    for components in component_sets:
+        constants_cache.constants_from_IDs(components)
+
+    tasks = [(sample, ghv, n_groups, n_plus, envelope_kwargs) for sample, ghv in zip(samples, ghvs)]
+    if max_workers == 1:
+        _init_worker(constants_cache.cache_dir, component_sets)
+        return [_trace_envelope(task) for task in tasks]
+
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker, initargs=(constants_cache.cache_dir, component_sets)) as executor:
+        return list(executor.map(_trace_envelope, tasks, chunksize=chunksize))
+
+
+def _init_worker(cache_dir, component_sets):
+    """
+    Warms the caches of a worker process with the constants of the component sets of the batch, and the kij store.
+    """
+    constants_cache.cache_dir = cache_dir  # not inherited by spawned processes
+    for components in component_sets:
+        _get_pure_constants(components)
+    kij_store.get_kij_store()
+
+
+@functools.lru_cache(maxsize=256)
+def _get_pure_constants(components):
+    """
+    :param components: tuple of pure component names
+    :return: (Tcs, Pcs, omegas, CASs)
+    """
+    constants = constants_cache.constants_from_IDs(components)
+    return np.array(constants.Tcs), np.array(constants.Pcs), np.array(constants.omegas), tuple(constants.CASs)
+
+
+def _pure_components(sample):
+    from utilities import is_fraction
+    return constants_cache.normalize_IDs([component for component in sample if not is_fraction(component)])
+
+
+def _trace_envelope(task):
+    from utilities import is_fraction, normalize_composition
+    from phase_envelope import PhaseEnvelope
+
+    sample, ghv, n_groups, n_plus, envelope_kwargs = task
+    try:
+        sample = normalize_composition(sample)
+        pure = [component for component in sample if not is_fraction(component)]
+        fractions = [component for component in sample if is_fraction(component)]
+        Tcs, Pcs, omegas, CASs = _get_pure_constants(_pure_components(sample))
+        zs = [sample[component] for component in pure]
+        sg_liqs = None
+
+        if fractions and sample[fractions[0]] > 0:
+            split = _characterize_fraction(pure, [sample[component] for component in pure + fractions[:1]], ghv, n_groups, n_plus)
+            Tcs, Pcs, omegas = np.append(Tcs, split['Tc']), np.append(Pcs, split['Pc']), np.append(omegas, split['omega'])
+            sg_liqs = split['sg_liq']
+            zs.extend(sample[fractions[0]] * split['zs'])
+
+        kijs = kij_store.get_kij_store().matrix(CASs, sg_liqs)
+
+        return PhaseEnvelope(zs, Tcs, Pcs, omegas, kijs=kijs, **envelope_kwargs)
+    except (ValueError, RuntimeError) as e:
+        print("Error in tracing the phase envelope of {}: {}".format(sample, e))
+        return None
+
+
+def _characterize_fraction(pure, zs, ghv, n_groups, n_plus):
+    """
+    :param pure: pure component names
+    :param zs: mole fractions of the pure components followed by the fraction
+    :param ghv: measured gross heating value of the whole gas (Btu/scf)
+    :return: dictionary of 'zs' (mole fractions within the fraction), 'sg_liq', 'Tc', 'Pc' and 'omega' arrays of the
+        pseudo-components of the fraction
+    """
+    from ghv_solver import solve_fraction_ghvs
+    from GasFraction import GasFraction
+
+    if ghv is None:
+        raise ValueError("A gross heating value is required to characterize the fraction.")
+    ghv_fraction = solve_fraction_ghvs(pure + ['fractions'], np.array([zs]), [ghv])[0]
+    fraction = GasFraction(ghv=ghv_fraction)
+    mw, sg_liq = fraction.attributes['mw'], fraction.attributes['_sg_liq']
+    if mw is None or sg_liq is None:
+        raise ValueError("Failed to characterize the fraction from ghv = %.1f Btu/scf." % ghv_fraction)
+
+    if n_groups > 1:
+        return plus_fraction.split_plus_fraction(mw, sg_liq, n_groups=n_groups, n_plus=n_plus)
+
+    # Light fractions (C6+) are below the C7+ working range of Pedersen's correlations, which are extrapolated there
+    Tc, Pc, omega, _ = characterization.pedersen(mw, sg_liq, eos='PR')
+    return {'zs': np.ones(1), 'sg_liq': np.atleast_1d(sg_liq), 'Tc': np.atleast_1d(Tc), 'Pc': np.atleast_1d(Pc), 'omega': np.atleast_1d(omega)}
+
+
+if __name__ == '__main__':
+    from utilities import statecordell, thurmond, combs_vru_discharge, brazos, combs_sep_gas
+    import timeit
+
+    samples = [statecordell, thurmond, combs_vru_discharge, brazos, combs_sep_gas] * 4
+    ghvs = [1721, 1159, 1904, 1320, 1727] * 4
+
+    start_time = timeit.default_timer()
+    envelopes = trace_envelopes(samples, ghvs)
+    print('%d envelopes in %.2f s' % (len(envelopes), timeit.default_timer() - start_time))
+    for envelope in envelopes[:5]:
+        if envelope is not None:
+            print(envelope.critical_point, envelope.cricondenbar, envelope.cricondentherm)
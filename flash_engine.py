@@ -0,0 +1,81 @@
+import functools
+import numpy as np
+import constants_cache
+import instrumentation
+import kij_store
+
+
+class FlashEngine(object):
+    """
+    Peng-Robinson flash for a fixed component set. The constants, kij matrix, PR gas/liquid phases and the flasher are
+    built once and kept. A flash that follows a two-phase result is warm-started from its phase compositions (K-values),
+    instead of running a cold stability test. A single-phase result clears the warm start: a sweep that has left the
+    envelope would otherwise start every later point from a stale two-phase state.
+    """
+
+    def __init__(self, components, kijs=None, n_liquids=1):
+        """
+        :param components: component names or CAS numbers
+        :param kijs: binary interaction parameter matrix. Sliced from the master matrix of kij_store by default.
+        :param n_liquids: number of liquid phases to look for. Use 2 when dealing with water.
+        """
+        from thermo import PRMIX, CEOSGas, CEOSLiquid, FlashVLN
+
+        self.components = list(components)
+        self.constants, self.properties = constants_cache.from_IDs(self.components)
+        if kijs is None:
+            kijs = kij_store.get_kij_store().matrix(self.constants.CASs).tolist()
+        self.kijs = kijs
+
+        eos_kwargs = dict(Tcs=self.constants.Tcs, Pcs=self.constants.Pcs, omegas=self.constants.omegas, kijs=kijs)
+        self.gas = CEOSGas(PRMIX, eos_kwargs, HeatCapacityGases=self.properties.HeatCapacityGases)
+        self.liquid = CEOSLiquid(PRMIX, eos_kwargs, HeatCapacityGases=self.properties.HeatCapacityGases)
+
+        # FlashVLN, because thermo's FlashVL ignores hot starts for TP flashes
+        self.flasher = FlashVLN(self.constants, self.properties, liquids=[self.liquid] * n_liquids, gas=self.gas)
+        self.last_two_phase = None
+
+    def flash(self, T, P, zs, warm_start=True):
+        """
+        :param T: temperature (K)
+        :param P: pressure (Pa)
+        :param zs: mole fractions, in the order of the components
+        :param warm_start: start from the K-values of the previous flash, if it was two-phase
+        :return: thermo's EquilibriumState
+        """
+        hot_start = self.last_two_phase if warm_start else None
+        with instrumentation.stage('flash'):
+            res = self.flasher.flash(T=T, P=P, zs=list(zs), hot_start=hot_start)
+        self.last_two_phase = res if res.phase_count > 1 else None
+        return res
+
+    def flash_many(self, Ts, Ps, zs, warm_start=True):
+        """
+        Flashes a sequence of points in order, each one warm-started from the previous point if it was two-phase.
+        Sweeps along a path (ex: increasing T at fixed P) benefit the most.
+
+        :param Ts: temperatures (K). Scalar or array, broadcast against Ps.
+        :param Ps: pressures (Pa). Scalar or array, broadcast against Ts.
+        :param zs: mole fractions. Either one composition for all points, or an (n_points, n_components) array.
+        :return: list of thermo's EquilibriumState, one per point
+        """
+        Ts, Ps = np.broadcast_arrays(np.atleast_1d(np.asarray(Ts, dtype=np.float64)), np.atleast_1d(np.asarray(Ps, dtype=np.float64)))
+        zs = np.asarray(zs, dtype=np.float64)
+        if zs.ndim == 1:
+            zs = np.broadcast_to(zs, (len(Ts), len(zs)))
+        if len(zs) != len(Ts):
+            raise ValueError("Got %d compositions for %d (T, P) points." % (len(zs), len(Ts)))
+
+        return [self.flash(T, P, z, warm_start=warm_start) for T, P, z in zip(Ts.tolist(), Ps.tolist(), zs.tolist())]
+
+
+@functools.lru_cache(maxsize=32)
+def _get_flash_engine(components, n_liquids):
+    return FlashEngine(components, n_liquids=n_liquids)
+
+
+def get_flash_engine(components, n_liquids=1):
+    """
+    :return: FlashEngine with the database kijs, built once per component set and reused afterwards
+    """
+    return _get_flash_engine(constants_cache.normalize_IDs(components), n_liquids)
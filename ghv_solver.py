@@ -0,0 +1,66 @@
+import functools
+import numpy as np
+import constants_cache
+from gpa_table import get_GPA_table
+from utilities import check_properties_exists, get_ghvs_pure_compounds, is_fraction
+from GasFraction import resolve_gas_fractions
+
+
+@functools.lru_cache(maxsize=256)
+def get_ghvs_pure(components):
+    """
+    :param components: tuple of pure component names
+    :return: ideal gas gross heating values of the components (Btu/scf), computed once per component tuple
+    """
+    constants = constants_cache.constants_from_IDs(components)
+    check_properties_exists(constants)
+    ghvs = get_ghvs_pure_compounds(constants, get_GPA_table())
+    ghvs.setflags(write=False)  # shared between callers
+    return ghvs
+
+
+def solve_fraction_ghvs(components, zs, ghvs):
+    """
+    Back-solves the gross heating value of the "fractions" pseudo-component of many gas analyses at once, with one
+    matrix-vector product against the pure component heating values:
+    ghv_fraction = (ghv - zs_pure @ ghvs_pure) / zs_fraction
+
+    :param components: component names of the columns of zs. Exactly one of them is the fraction. Ex: ['methane', ...,
+        'fractions']
+    :param zs: (n_samples, n_components) composition matrix. Rows are normalized to sum to 1.
+    :param ghvs: (n_samples,) measured gross heating values of the whole gas (Btu/scf)
+    :return: ghv_fraction, (n_samples,) array. nan for the samples without a fraction.
+    """
+    fraction_index = [i for i, component in enumerate(components) if is_fraction(component)]
+    if len(fraction_index) != 1:
+        raise ValueError("Exactly one fraction component is required, found %d in %s" % (len(fraction_index), list(components)))
+    fraction_index = fraction_index[0]
+    pure_index = [i for i in range(len(components)) if i != fraction_index]
+
+    zs = np.asarray(zs, dtype=np.float64)
+    zs = zs / zs.sum(axis=1, keepdims=True)
+    ghvs_pure = get_ghvs_pure(tuple(components[i] for i in pure_index))
+
+    zs_fraction = zs[:, fraction_index]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ghv_fraction = (np.asarray(ghvs, dtype=np.float64) - zs[:, pure_index] @ ghvs_pure) / zs_fraction
+    ghv_fraction[~(zs_fraction > 0)] = np.nan
+    return ghv_fraction
+
+
+def characterize_fractions(components, zs, ghvs, index=None):
+    """
+    Back-solves the fraction heating values of many gas analyses, and resolves the fraction mw/sg from them with the
+    batch GasFraction resolver.
+
+    :param components: component names of the columns of zs. Exactly one of them is the fraction.
+    :param zs: (n_samples, n_components) composition matrix
+    :param ghvs: (n_samples,) measured gross heating values of the whole gas (Btu/scf)
+    :param index: optional index of the returned dataframe. Ex: sample ids
+    :return: pandas DataFrame of the resolved fraction attributes, one row per sample. The 'ghv' column is the back-solved
+        fraction heating value.
+    """
+    import pandas as pd
+
+    ghv_fraction = solve_fraction_ghvs(components, zs, ghvs)
+    return resolve_gas_fractions(pd.DataFrame({'ghv': ghv_fraction}, index=index))
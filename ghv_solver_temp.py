@@ -4,21 +4,21 @@ from thermo import ChemicalConstantsPackage, PRMIX, CEOSLiquid, CEOSGas, FlashVL
 import thermo
 import chemicals
 from thermo.interaction_parameters import IPDB
-import pint
 import copy
 import fluids
 import config
 import timeit
 from scipy.optimize import newton
 import correlations
+import constants_cache
+import units
+from gpa_table import get_GPA_table
 
 start_time1 = timeit.default_timer()
 
 pd.set_option('display.max_columns', None)
 pd.set_option('display.max_rows', None)
 
-ureg = pint.UnitRegistry()
-
 settings = {
     "T_STANDARD": 288.70555,  # Temperature in Kelvin, 60F
     "P_STANDARD": 101325.0,  # Pressure in Pascal, 1 atm
@@ -82,9 +82,7 @@ def is_fraction(s):
     return s.lower() in ['fraction', 'fractions']
 
 
-df = pd.read_pickle("GPA 2145-16 Compound Properties Table - English.pkl")
-
-# df = df[df['Compound'] != 'nitrogen']
+GPA_table = get_GPA_table()
 
 comp_dict = dict([
     ('methane', 3),
@@ -107,7 +105,7 @@ comp_dict = normalize_composition(comp_dict)
 comps = list(comp_dict.keys())
 zs = list(comp_dict.values())
 
-constants = ChemicalConstantsPackage.constants_from_IDs(comps)
+constants = constants_cache.constants_from_IDs(comps)
 
 # check if the compounds have molecular weight and normal boiling T data
 check_properties_exists(constants)
@@ -118,20 +116,21 @@ V_molar = ideal_gas_molar_volume()
 ghvs = []
 nhvs = []
 
-for cas, name, Hc, mw, rhol_60F_mass in zip(constants.CASs, constants.names, constants.Hcs, constants.MWs,
-                                            constants.rhol_60Fs_mass):
+ghvs_GPA, found = GPA_table.lookup('ghv', constants.CASs)
+ghvs_Hc = units.convert(np.array(constants.Hcs, dtype=np.float64) / V_molar, 'joule/m^3', 'Btu/ft^3') * -1
+
+for ghv_GPA, is_found, ghv_Hc, name, Hc, mw, rhol_60F_mass in zip(ghvs_GPA, found, ghvs_Hc, constants.names, constants.Hcs,
+                                                                  constants.MWs, constants.rhol_60Fs_mass):
 
-    matching_row = df[df['CAS'] == cas]
     print(name, '--------------------------------------')
 
     # chemical is found in the GPA data table
-    if not matching_row.empty:
-        ghv_ideal = matching_row['Gross Heating Value Ideal Gas [Btu/ft^3]'].iloc[0]
+    if is_found:
+        ghv_ideal = ghv_GPA
 
-        if pd.isna(ghv_ideal):
+        if np.isnan(ghv_ideal):
             if Hc != 0:  # chemically inert or contains to combustible energy. Skip them. Ex: nitrogen, argon, helium
-                ghv_ideal = Hc / V_molar
-                ghv_ideal = ureg('%.15f joule/m^3' % ghv_ideal).to('Btu/ft^3')._magnitude * -1
+                ghv_ideal = ghv_Hc
             else:
                 ghv_ideal = 0
 
@@ -151,8 +150,7 @@ for cas, name, Hc, mw, rhol_60F_mass in zip(constants.CASs, constants.names, con
             """
             pass  # Todo: implement a handler that can correlate API to ghv for a working range of the model. Show a warning sign if outside range. Prompt the user to activate ghv_correlate=True
         else:
-            ghv_ideal = Hc / V_molar  # Hc = Heat of combustio, J/mol. V_molar = molar volume, m^3/mol
-            ghv_ideal = ureg('%.15f joule/m^3' % ghv_ideal).to('Btu/ft^3')._magnitude * -1
+            ghv_ideal = ghv_Hc  # Hc = Heat of combustio, J/mol. V_molar = molar volume, m^3/mol
 
     print('ghv_gas (BTU/scf) (Hc/V_molar):    %.1f' % ghv_ideal)
 
@@ -0,0 +1,85 @@
+import os
+import numpy as np
+import config
+import instrumentation
+
+
+DEFAULT_GPA_TABLE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'GPA 2145-16 Compound Properties Table - English.pkl')
+
+
+class GPATable(object):
+    """
+    GPA 2145-16 compound properties table, indexed by CAS number. The columns mapped in config.GPA_table_column_mapping
+    are stored as contiguous float64 arrays, so that a whole component list is looked up with one fancy-indexing call
+    instead of a boolean scan of the dataframe per component.
+    """
+
+    def __init__(self, df):
+        """
+        :param df: pandas dataframe of the GPA 2145-16 Table
+        """
+        import pandas as pd
+
+        # Some CAS numbers are shared by two isomers in the table. Keep the first row, as df[df['CAS'] == cas].iloc[0] did
+        self.cas_index = {}
+        for i, cas in enumerate(df['CAS']):
+            if isinstance(cas, str) and cas.strip():
+                self.cas_index.setdefault(cas.strip(), i)
+
+        self.compounds = df['Compound'].tolist()
+        self.columns = {}
+        for key, column in config.GPA_table_column_mapping.items():
+            if column in df.columns:
+                self.columns[key] = np.ascontiguousarray(pd.to_numeric(df[column], errors='coerce'), dtype=np.float64)
+
+    @classmethod
+    def from_file(cls, path=DEFAULT_GPA_TABLE):
+        """
+        :param path: .pkl or .xlsx file of the GPA 2145-16 Table
+        """
+        import pandas as pd
+
+        if path.lower().endswith('.pkl'):
+            df = pd.read_pickle(path)
+        elif path.lower().endswith(('.xlsx', '.xls')):
+            df = pd.read_excel(path)
+        else:
+            raise ValueError("Unsupported GPA table file '%s'. Available formats are ['.pkl', '.xlsx']" % path)
+        return cls(df)
+
+    def indices(self, CASs):
+        """
+        :param CASs: list of CAS numbers
+        :return: row indices of the CAS numbers in the table. -1 for the ones that are not found.
+        """
+        return np.array([self.cas_index.get(cas, -1) for cas in CASs], dtype=np.intp)
+
+    def lookup(self, key, CASs):
+        """
+        :param key: property key of config.GPA_table_column_mapping. Ex: 'ghv'
+        :param CASs: list of CAS numbers
+        :return: (values, found). values is a float64 array, nan where the CAS is not found or the table has no data.
+            found is a boolean array that is True where the CAS is found in the table.
+        """
+        if key not in self.columns:
+            raise KeyError("Property '%s' is not available in the GPA table. Available properties are %s" % (key, list(self.columns.keys())))
+        with instrumentation.stage('ghv_table'):
+            idx = self.indices(CASs)
+            found = idx >= 0
+            values = np.full(len(idx), np.nan)
+            values[found] = self.columns[key][idx[found]]
+        return values, found
+
+
+_tables = {}
+
+
+def get_GPA_table(path=DEFAULT_GPA_TABLE):
+    """
+    :param path: .pkl or .xlsx file of the GPA 2145-16 Table
+    :return: GPATable, loaded once per file and reused afterwards
+    """
+    path = os.path.abspath(path)
+    if path not in _tables:
+        _tables[path] = GPATable.from_file(path)
+    return _tables[path]
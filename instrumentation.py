@@ -0,0 +1,153 @@
+"""
+Opt-in instrumentation of the hot paths: wall time per stage (constants lookup, heating value table lookup, correlation
+solves, flash, envelope), root-finder iterations and failures per correlation, and outcomes per solve plan. Disabled by
+default, where every hook is a flag check or a shared no-op context manager.
+
+Ex:
+    import instrumentation
+    instrumentation.enable()
+    ...
+    print(instrumentation.to_prometheus())
+
+Aggregates are kept per process. With envelope_batch's process pool, enable and export in the workers.
+"""
+import time
+import contextlib
+import functools
+
+
+PREFIX = 'phaseenvelope'
+
+enabled = False
+
+stages = {}  # {stage: [calls, total seconds, max seconds]}
+solvers = {}  # {correlation: [calls, iterations, failures]}
+plans = {}  # {(resolver, plan): [calls, failures]}
+counters = {}  # {name: value}
+
+_null = contextlib.nullcontext()
+
+
+def enable():
+    global enabled
+    enabled = True
+
+
+def disable():
+    global enabled
+    enabled = False
+
+
+def reset():
+    stages.clear()
+    solvers.clear()
+    plans.clear()
+    counters.clear()
+
+
+class _Stage(object):
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        record_stage(self.name, time.perf_counter() - self.start)
+
+
+def stage(name):
+    """
+    :return: context manager that times its body as one call of the stage. A shared no-op when disabled.
+    """
+    return _Stage(name) if enabled else _null
+
+
+def timed(name):
+    """
+    Decorator version of stage()
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return func(*args, **kwargs)
+            with _Stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record_stage(name, seconds):
+    entry = stages.setdefault(name, [0, 0.0, 0.0])
+    entry[0] += 1
+    entry[1] += seconds
+    entry[2] = max(entry[2], seconds)
+
+
+def record_solve(correlation, iterations, failures):
+    """
+    :param correlation: name of the correlation
+    :param iterations: residual evaluations of the root finder. One per Newton iteration, for a whole batch at once.
+    :param failures: number of values that failed to converge. Rows of a batch count separately.
+    """
+    entry = solvers.setdefault(correlation, [0, 0, 0])
+    entry[0] += 1
+    entry[1] += iterations
+    entry[2] += failures
+
+
+def record_plan(resolver, provided, failed):
+    """
+    :param resolver: name of the resolver. Ex: 'GasFraction'
+    :param provided: names of the known attributes, which determine the solve plan
+    :param failed: whether the plan was aborted by a failed solve
+    """
+    entry = plans.setdefault((resolver, '+'.join(sorted(provided))), [0, 0])
+    entry[0] += 1
+    entry[1] += bool(failed)
+
+
+def increment(name, value=1):
+    counters[name] = counters.get(name, 0) + value
+
+
+def as_dict():
+    """
+    :return: dictionary of the aggregates
+    """
+    return {
+        'stages': {name: {'calls': calls, 'total_s': total, 'mean_s': total / calls, 'max_s': longest} for name, (calls, total, longest) in stages.items()},
+        'solvers': {name: {'calls': calls, 'iterations': iterations, 'failures': failures} for name, (calls, iterations, failures) in solvers.items()},
+        'plans': {'%s: %s' % key: {'calls': calls, 'failures': failures} for key, (calls, failures) in plans.items()},
+        'counters': dict(counters),
+    }
+
+
+def to_prometheus():
+    """
+    :return: the aggregates in the Prometheus text exposition format
+    """
+    lines = []
+
+    def metric(name, kind, description, samples):
+        lines.append('# HELP %s_%s %s' % (PREFIX, name, description))
+        lines.append('# TYPE %s_%s %s' % (PREFIX, name, kind))
+        for labels, value in samples:
+            label_text = ','.join('%s="%s"' % (key, str(label).replace('\\', '\\\\').replace('"', '\\"')) for key, label in labels)
+            lines.append('%s_%s%s %r' % (PREFIX, name, '{%s}' % label_text if label_text else '', value))
+
+    metric('stage_calls_total', 'counter', 'Calls per stage.', [((('stage', name),), entry[0]) for name, entry in stages.items()])
+    metric('stage_seconds_total', 'counter', 'Wall time per stage.', [((('stage', name),), entry[1]) for name, entry in stages.items()])
+    metric('stage_seconds_max', 'gauge', 'Longest call per stage.', [((('stage', name),), entry[2]) for name, entry in stages.items()])
+    metric('solver_calls_total', 'counter', 'Root-finder calls per correlation.', [((('correlation', name),), entry[0]) for name, entry in solvers.items()])
+    metric('solver_iterations_total', 'counter', 'Root-finder iterations per correlation.', [((('correlation', name),), entry[1]) for name, entry in solvers.items()])
+    metric('solver_failures_total', 'counter', 'Values that failed to converge per correlation.', [((('correlation', name),), entry[2]) for name, entry in solvers.items()])
+    metric('plan_calls_total', 'counter', 'Resolutions per solve plan.', [((('resolver', resolver), ('plan', plan)), entry[0]) for (resolver, plan), entry in plans.items()])
+    metric('plan_failures_total', 'counter', 'Aborted resolutions per solve plan.', [((('resolver', resolver), ('plan', plan)), entry[1]) for (resolver, plan), entry in plans.items()])
+    for name, value in counters.items():
+        metric(name + '_total', 'counter', name.replace('_', ' ').capitalize() + '.', [((), value)])
+    return '\n'.join(lines) + '\n'
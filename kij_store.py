@@ -0,0 +1,136 @@
+"""
+Binary interaction parameters (kij) of the Peng-Robinson EOS, precomputed once as a dense matrix over the whole component
+universe (every compound of the GPA 2145-16 table). The kij matrix of a mixture is then a fancy-indexing slice of the
+master matrix, instead of a database query per mixture.
+
+Pseudo-components (plus fractions) are not in any database. Their kijs with the pure components are correlated with
+their liquid specific gravity, and are zero with each other.
+"""
+import numpy as np
+import constants_cache
+from gpa_table import get_GPA_table
+
+
+METHANE = '74-82-8'
+
+# kij of the non-hydrocarbons with heavy hydrocarbon fractions, for PR.
+# source: Pedersen, K. S., Christensen, P. L.: "Phase Behavior of Petroleum Reservoir Fluids," (2007), sec 5.6
+pseudo_kijs_constant = {
+    '7727-37-9': 0.08,  # nitrogen
+    '124-38-9': 0.10,  # carbon dioxide
+    '7783-06-4': 0.05,  # hydrogen sulfide
+}
+
+
+class KijStore(object):
+    """
+    Dense kij matrix over a component universe, indexed by CAS number.
+    """
+
+    def __init__(self, CASs, ip_source='ChemSep PR'):
+        """
+        :param CASs: CAS numbers of the component universe
+        :param ip_source: interaction parameter table of thermo's IPDB
+        """
+        self.ip_source = ip_source
+        self.CASs = []
+        self.index = {}
+        self.kijs = np.zeros((0, 0))
+        self.add(CASs)
+
+    def add(self, CASs):
+        """
+        Extends the universe with the CAS numbers that are not in it yet, with one database query for the whole
+        extended matrix.
+        """
+        from thermo.interaction_parameters import IPDB
+
+        new = [cas for cas in dict.fromkeys(CASs) if cas not in self.index]
+        if not new:
+            return
+        CASs = self.CASs + new
+        n = len(CASs)
+        kijs = np.array(IPDB.get_ip_asymmetric_matrix(self.ip_source, CASs, 'kij'), dtype=np.float64).reshape(n, n)
+        kijs.setflags(write=False)  # slices are copies, but the master matrix is shared
+        self.CASs, self.kijs = CASs, kijs
+        self.index = {cas: i for i, cas in enumerate(CASs)}
+
+    def indices(self, CASs):
+        """
+        :return: positions of the CAS numbers in the master matrix. Missing ones are added first.
+        """
+        if any(cas not in self.index for cas in CASs):
+            self.add(CASs)
+        return np.array([self.index[cas] for cas in CASs], dtype=np.intp)
+
+    def matrix(self, CASs, sg_liqs=None):
+        """
+        :param CASs: CAS numbers of the pure components of the mixture
+        :param sg_liqs: liquid specific gravities of the pseudo-components, which follow the pure components
+        :return: kij matrix of the mixture, (n + m, n + m)
+        """
+        idx = self.indices(CASs)
+        kijs = self.kijs[np.ix_(idx, idx)]
+        if sg_liqs is None or len(sg_liqs) == 0:
+            return kijs
+
+        n, m = len(idx), len(sg_liqs)
+        full = np.zeros((n + m, n + m))
+        full[:n, :n] = kijs
+        full[:n, n:] = pseudo_kijs(CASs, sg_liqs)
+        full[n:, :n] = full[:n, n:].T
+        return full
+
+
+def pseudo_kijs(CASs, sg_liqs):
+    """
+    source: Katz, D. L., Firoozabadi, A.: "Predicting Phase Behavior of Condensate/Crude-Oil Systems Using Methane
+        Interaction Coefficients," Journal of Petroleum Technology 30 (1978) 1649-1655, for methane. Constants of
+        pseudo_kijs_constant for the non-hydrocarbons. Zero for the other hydrocarbons.
+    notes: methane kij = 0.14 * sg_liq - 0.0668, for PR
+    working range: C7+ fractions
+
+    :param CASs: CAS numbers of the pure components
+    :param sg_liqs: liquid specific gravities of the pseudo-components
+    :return: kijs between the pure and pseudo-components, (n, m)
+    """
+    sg_liqs = np.atleast_1d(np.asarray(sg_liqs, dtype=np.float64))
+    kijs = np.zeros((len(CASs), len(sg_liqs)))
+    for i, cas in enumerate(CASs):
+        if cas == METHANE:
+            kijs[i] = 0.14 * sg_liqs - 0.0668
+        elif cas in pseudo_kijs_constant:
+            kijs[i] = pseudo_kijs_constant[cas]
+    return kijs
+
+
+_store = None
+
+
+def get_kij_store():
+    """
+    :return: KijStore over the compounds of the GPA 2145-16 table, built once per process and reused afterwards
+    """
+    global _store
+    if _store is None:
+        _store = KijStore(list(get_GPA_table().cas_index))
+    return _store
+
+
+def kijs_from_IDs(IDs, sg_liqs=None):
+    """
+    :param IDs: component names or CAS numbers of the pure components
+    :param sg_liqs: liquid specific gravities of the pseudo-components, which follow the pure components
+    :return: kij matrix of the mixture
+    """
+    return get_kij_store().matrix(constants_cache.constants_from_IDs(IDs).CASs, sg_liqs)
+
+
+if __name__ == '__main__':
+    from utilities import statecordell, is_fraction
+    import timeit
+
+    IDs = [component for component in statecordell if not is_fraction(component)]
+    kijs = kijs_from_IDs(IDs, sg_liqs=[0.76, 0.81, 0.85])
+    print(np.round(kijs, 4))
+    print('%.1f us per mixture' % (1e6 * timeit.timeit(lambda: kijs_from_IDs(IDs, [0.76, 0.81, 0.85]), number=1000) / 1000))
@@ -0,0 +1,210 @@
+"""
+Streaming reader of gas analysis lab reports (CSV, Excel or JSON lines), one row per sample and one column per component.
+Files are read in chunks of rows, never loaded whole, and each chunk is turned into a fixed-width composition block whose
+columns follow one component index, ready for the batch heating value and phase envelope stages. Results are written out
+chunk by chunk as they are computed.
+
+Ex: CSV report
+
+    sample,ghv,methane,ethane,propane,...,fractions
+    A-101,1721,51.087,19.911,14.883,...,1.472
+"""
+import os
+import numpy as np
+import pandas as pd
+import constants_cache
+from utilities import is_fraction, normalize_compositions
+
+
+class CompositionBlock(object):
+
+    def __init__(self, components, zs, ids, ghvs, start):
+        """
+        :param components: component names of the columns of zs, the component index of the reader
+        :param zs: (n_samples, n_components) float64 compositions, zeros for the components missing from the report
+        :param ids: sample ids. The row numbers in the file when the report has no id column.
+        :param ghvs: measured gross heating values (Btu/scf), nan where missing. None when the report has no ghv column.
+        :param start: row number of the first sample of the block in the file
+        """
+        self.components = components
+        self.zs = zs
+        self.ids = ids
+        self.ghvs = ghvs
+        self.start = start
+
+    def __len__(self):
+        return len(self.zs)
+
+
+def read_lab_reports(path, components, chunksize=10000, id_column=None, ghv_column=None, normalize=True, file_format=None):
+    """
+    :param path: .csv, .xlsx or .jsonl file
+    :param components: component index of the blocks. Ex: ['nitrogen', 'methane', ..., 'fractions']. Report columns are
+        matched to it by name, or by CAS number for aliases like 'i-pentane' and 'isopentane'.
+    :param chunksize: number of samples per block
+    :param id_column: name of the column of sample ids
+    :param ghv_column: name of the column of measured gross heating values (Btu/scf)
+    :param normalize: normalize every composition to sum to 1. Reports are usually in mol %.
+    :param file_format: 'csv', 'excel' or 'jsonl'. Guessed from the file extension by default.
+    :return: generator of CompositionBlock
+    """
+    components = list(components)
+    file_format = file_format or _guess_format(path)
+    if file_format == 'csv':
+        chunks = pd.read_csv(path, chunksize=chunksize)
+    elif file_format == 'jsonl':
+        chunks = pd.read_json(path, lines=True, chunksize=chunksize)
+    elif file_format == 'excel':
+        chunks = _read_excel_chunks(path, chunksize)
+    else:
+        raise ValueError("Unsupported file format '%s'. Available formats are ['csv', 'excel', 'jsonl']" % file_format)
+
+    columns = None
+    start = 0
+    for chunk in chunks:
+        if columns is None:
+            # Resolved once per file, from the header
+            metadata = [column for column in (id_column, ghv_column) if column is not None]
+            columns = _align_columns([column for column in chunk.columns if column not in metadata], components)
+
+        zs = np.zeros((len(chunk), len(components)))
+        for column, j in columns.items():
+            zs[:, j] += pd.to_numeric(chunk[column], errors='coerce').fillna(0).to_numpy(dtype=np.float64)
+        if normalize:
+            zs = normalize_compositions(zs)
+
+        ids = chunk[id_column].to_numpy() if id_column is not None else np.arange(start, start + len(chunk))
+        ghvs = pd.to_numeric(chunk[ghv_column], errors='coerce').to_numpy(dtype=np.float64) if ghv_column is not None else None
+        yield CompositionBlock(components, zs, ids, ghvs, start)
+        start += len(chunk)
+
+
+def characterize_lab_reports(path, components, out_path, id_column=None, ghv_column='ghv', chunksize=10000, **kwargs):
+    """
+    Back-solves and characterizes the fraction of every sample of a lab report file, block by block, appending the
+    results of each block to out_path as soon as they are computed.
+
+    :param components: component index. Exactly one of them is the fraction.
+    :param out_path: .csv file of the results, one row per sample. Overwritten.
+    :param kwargs: passed to read_lab_reports()
+    :return: number of samples processed
+    """
+    from ghv_solver import characterize_fractions
+
+    n_samples = 0
+    with ResultWriter(out_path) as writer:
+        for block in read_lab_reports(path, components, chunksize=chunksize, id_column=id_column, ghv_column=ghv_column, **kwargs):
+            writer.write(characterize_fractions(components, block.zs, block.ghvs, index=pd.Index(block.ids, name='sample')))
+            n_samples += len(block)
+    return n_samples
+
+
+class ResultWriter(object):
+    """
+    Appends dataframes to one CSV file, writing the header with the first one only.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.f = None
+
+    def __enter__(self):
+        self.f = open(self.path, 'w', newline='')
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.f.close()
+
+    def write(self, df):
+        df.to_csv(self.f, header=self.f.tell() == 0)
+        self.f.flush()
+
+
+def _guess_format(path):
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.csv':
+        return 'csv'
+    elif extension in ('.xlsx', '.xlsm'):
+        return 'excel'
+    elif extension in ('.jsonl', '.json'):
+        return 'jsonl'
+    raise ValueError("Unsupported file extension '%s'. Available extensions are ['.csv', '.xlsx', '.jsonl']" % extension)
+
+
+def _read_excel_chunks(path, chunksize):
+    """
+    Reads the first sheet row by row in openpyxl's read-only mode, since pandas.read_excel() has no chunked reading.
+    """
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) == chunksize:
+                yield pd.DataFrame(chunk, columns=header)
+                chunk = []
+        if chunk:
+            yield pd.DataFrame(chunk, columns=header)
+    finally:
+        workbook.close()
+
+
+def _align_columns(columns, components):
+    """
+    :return: {report column: position in components}. Columns of aliases of the same component add up.
+    """
+    names = constants_cache.normalize_IDs(components)
+    positions = {name: j for j, name in enumerate(names)}
+    fraction_positions = [j for j, component in enumerate(components) if is_fraction(component)]
+
+    aligned, unmatched = {}, []
+    for column in columns:
+        name = constants_cache.normalize_IDs([str(column)])[0]
+        if name in positions:
+            aligned[column] = positions[name]
+        elif is_fraction(name) and fraction_positions:
+            aligned[column] = fraction_positions[0]
+        else:
+            unmatched.append(column)
+
+    if unmatched:
+        # Match the remaining columns by CAS number
+        pure = [j for j, component in enumerate(components) if not is_fraction(component)]
+        CASs = constants_cache.constants_from_IDs([components[j] for j in pure]).CASs
+        cas_positions = {cas: j for cas, j in zip(CASs, pure)}
+        for column in unmatched:
+            try:
+                cas = constants_cache.constants_from_IDs([str(column)]).CASs[0]
+            except ValueError:
+                cas = None
+            if cas not in cas_positions:
+                raise ValueError("Column '%s' of the lab report is not a component of %s." % (column, components))
+            aligned[column] = cas_positions[cas]
+    return aligned
+
+
+if __name__ == '__main__':
+    from utilities import statecordell, thurmond, combs_vru_discharge, brazos, combs_sep_gas
+    import tempfile
+    import timeit
+
+    components = list(combs_vru_discharge)
+    samples = [statecordell, thurmond, combs_vru_discharge, brazos, combs_sep_gas]
+    ghvs = [1721, 1159, 1904, 1320, 1727]
+    report = pd.DataFrame(samples * 2000).fillna(0)
+    report.insert(0, 'ghv', ghvs * 2000)
+
+    directory = tempfile.mkdtemp()
+    path, out_path = os.path.join(directory, 'reports.csv'), os.path.join(directory, 'fractions.csv')
+    report.to_csv(path, index_label='sample')
+
+    start_time = timeit.default_timer()
+    n_samples = characterize_lab_reports(path, components, out_path, id_column='sample', chunksize=2500)
+    print('%d samples in %.2f s' % (n_samples, timeit.default_timer() - start_time))
+    print(pd.read_csv(out_path, nrows=5))
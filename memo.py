@@ -0,0 +1,198 @@
+"""
+Memoization of correlation solves and of whole GasFraction / PseudoComponent resolutions, in bounded LRU caches with
+hit/miss statistics. The caches can be persisted to disk between runs.
+
+Production samples repeat a lot, so resolutions are cached under their inputs quantized to the 5 decimal places the
+classes round their attributes to: a hit returns the result of a previous input within 5e-6. Correlation solves see
+unrounded intermediate values, where 5 decimals would shift the results of steep correlations by more than the rounding
+of the outputs, so they are quantized to SOLVE_DIGITS significant digits instead. They still hit for repeated inputs,
+whose intermediate values are identical.
+
+Every key starts with a fingerprint of config.constants, so that results computed under other standard conditions, in
+this process before an update_config() or in a persisted file of another run, are never returned. Results with nan or
+inf values are not cached, so that failed solves are retried and reported every time.
+
+Disabled by default, as hits return the results of quantized inputs.
+
+Ex:
+    import memo
+    memo.enable()
+    memo.enable_persistence()  # load now, save at exit
+    memo.stats()
+"""
+import os
+import json
+import atexit
+import math
+import hashlib
+import collections
+import config
+
+
+CACHE_VERSION = 1
+DECIMALS = 5  # same rounding as GasFraction and PseudoComponent
+SOLVE_DIGITS = 12  # significant digits of the arguments of correlation solves
+default_path = os.path.join(os.path.expanduser('~'), '.cache', 'PhaseEnvelope-py', 'memo', 'v%d.json' % CACHE_VERSION)
+
+enabled = False
+
+
+class QuantizedLRU(object):
+    """
+    Bounded LRU cache. Values must be JSON serializable for save().
+    """
+
+    def __init__(self, maxsize=4096):
+        self.maxsize = maxsize
+        self.data = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """
+        :return: cached value, or None on a miss
+        """
+        try:
+            value = self.data[key]
+        except KeyError:
+            self.misses += 1
+            return None
+        self.data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        self.data[key] = value
+        self.data.move_to_end(key)
+        while len(self.data) > self.maxsize:
+            self.data.popitem(last=False)
+
+    def clear(self):
+        self.data.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self):
+        calls = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses, 'hit_rate': self.hits / calls if calls else 0.0, 'size': len(self.data), 'maxsize': self.maxsize}
+
+
+caches = {
+    'correlations': QuantizedLRU(),
+    'GasFraction': QuantizedLRU(),
+    'PseudoComponent': QuantizedLRU(),
+}
+
+
+def quantize(value):
+    """
+    :return: value rounded to DECIMALS if it is a float, else value as is. Ex: 4800.0000012 -> 4800.0
+    """
+    if isinstance(value, float):
+        return round(value, DECIMALS)
+    return value
+
+
+def key(*values):
+    """
+    :return: hashable cache key of the fingerprint and the quantized values
+    """
+    return (fingerprint(),) + tuple(quantize(value) for value in values)
+
+
+def solve_key(*values):
+    """
+    :return: hashable cache key of the values rounded to SOLVE_DIGITS significant digits
+    """
+    return tuple(float('%.*g' % (SOLVE_DIGITS, value)) if isinstance(value, float) else value for value in values)
+
+
+def finite(value):
+    """
+    :return: False if value, or one of the values of the dictionary value, is a nan or inf number
+    """
+    values = value.values() if isinstance(value, dict) else [value]
+    return all(math.isfinite(v) for v in values if isinstance(v, (int, float)))
+
+
+_fingerprint = [None, None]  # [config.version, fingerprint]
+
+
+def fingerprint():
+    """
+    :return: short hash of config.constants, recomputed after every update_config()
+    """
+    if _fingerprint[0] != config.version:
+        text = json.dumps(config.constants, sort_keys=True)
+        _fingerprint[:] = config.version, hashlib.sha1(text.encode()).hexdigest()[:12]
+    return _fingerprint[1]
+
+
+def enable():
+    global enabled
+    enabled = True
+
+
+def disable():
+    global enabled
+    enabled = False
+
+
+def clear():
+    for cache in caches.values():
+        cache.clear()
+
+
+def stats():
+    """
+    :return: {cache name: {'hits', 'misses', 'hit_rate', 'size', 'maxsize'}}
+    """
+    return {name: cache.stats() for name, cache in caches.items()}
+
+
+def save(path=None):
+    """
+    Writes the content of the caches to a JSON file, atomically.
+    """
+    path = path or default_path
+    data = {name: [[list(k), v] for k, v in cache.data.items()] for name, cache in caches.items()}
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = '%s.%d.tmp' % (path, os.getpid())
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def load(path=None):
+    """
+    Adds the entries of a JSON file written by save() to the caches. A missing or corrupted file is ignored.
+
+    :return: number of entries loaded
+    """
+    path = path or default_path
+    try:
+        with open(path) as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return 0
+
+    n = 0
+    for name, entries in data.items():
+        if name in caches:
+            for k, v in entries:
+                caches[name].put(_as_key(k), v)
+                n += 1
+    return n
+
+
+def enable_persistence(path=None):
+    """
+    Loads the caches from path now, and saves them back when the interpreter exits.
+    """
+    load(path)
+    atexit.register(save, path)
+
+
+def _as_key(value):
+    # JSON turns the key tuples into lists, nested for correlation arguments
+    return tuple(_as_key(item) for item in value) if isinstance(value, list) else value
@@ -0,0 +1,58 @@
+def compile_plan(correlations, provided, first_steps=(), skip=()):
+    """
+    Turns the correlation graph of a resolver into an ordered solve plan. The order is the one of a repeated scan over
+    the correlations, where a correlation is solved as soon as exactly one of its variables is unresolved.
+
+    :param correlations: dictionary of {correlation_func: [variables in argument order]}, in scan order
+    :param provided: names of the variables that are known
+    :param first_steps: (correlation_func, variable) pairs solved before the scan, if all their other variables are
+        provided
+    :param skip: variables that are never solved for
+    :return: tuple of (correlation_func, variables, unknown) steps, in resolution order
+    """
+    resolved = set(provided)
+    plan = []
+
+    for correlation_func, unknown in first_steps:
+        variables = tuple(correlations[correlation_func])
+        if unknown not in resolved and all(var in resolved for var in variables if var != unknown):
+            plan.append((correlation_func, variables, unknown))
+            resolved.add(unknown)
+
+    while True:
+        resolved_this_iteration = False
+        for correlation_func, variables in correlations.items():
+            unresolved_vars = [var for var in variables if var not in resolved]
+            if len(unresolved_vars) == 1 and unresolved_vars[0] not in skip:
+                plan.append((correlation_func, tuple(variables), unresolved_vars[0]))
+                resolved.add(unresolved_vars[0])
+                resolved_this_iteration = True
+
+        if not resolved_this_iteration:
+            break
+
+    return tuple(plan)
+
+
+class SolvePlanner(object):
+    """
+    Compiles solve plans of a correlation graph once per set of provided variables, and caches them. Feeds usually come
+    in only a handful of input patterns (mw only, sg only, ghv only, mw+sg), so resolvers end up replaying cached plans.
+    """
+
+    def __init__(self, correlations, first_steps=(), skip=()):
+        self.correlations = correlations
+        self.first_steps = tuple(first_steps)
+        self.skip = frozenset(skip)
+        self.plans = {}
+
+    def plan(self, provided):
+        """
+        :param provided: names of the variables that are known
+        :return: tuple of (correlation_func, variables, unknown) steps, in resolution order
+        """
+        provided = frozenset(provided)
+        plan = self.plans.get(provided)
+        if plan is None:
+            plan = self.plans[provided] = compile_plan(self.correlations, provided, self.first_steps, self.skip)
+        return plan
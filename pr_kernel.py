@@ -0,0 +1,209 @@
+"""
+Vectorized Peng-Robinson kernel. Evaluates the mixing rules, the compressibility factor and the fugacity coefficients of
+many states at once, as numpy array operations over (state, component) arrays. There is no Python loop over states and
+no per-state object, unlike thermo's PRMIX.
+
+States are given as T (m,), P (m,) and compositions xs (m, n). Scalars and single compositions are broadcast.
+"""
+import numpy as np
+
+
+R = 8.31446261815324  # J/(mol-K)
+OMEGA_A = 0.45723552892138218  # PR constants, exact roots of the critical point conditions
+OMEGA_B = 0.0777960739038885
+SQRT2 = np.sqrt(2)
+
+
+class PRKernel(object):
+
+    def __init__(self, Tcs, Pcs, omegas, kijs=None):
+        """
+        :param Tcs: critical temperatures of the components (K)
+        :param Pcs: critical pressures of the components (Pa)
+        :param omegas: acentric factors of the components
+        :param kijs: binary interaction parameter matrix. Zeros by default.
+        """
+        self.Tcs = np.asarray(Tcs, dtype=np.float64)
+        self.Pcs = np.asarray(Pcs, dtype=np.float64)
+        self.omegas = np.asarray(omegas, dtype=np.float64)
+        n = len(self.Tcs)
+        self.kijs = np.zeros((n, n)) if kijs is None else np.asarray(kijs, dtype=np.float64).reshape(n, n)
+
+        # Temperature-independent parts of the PR parameters
+        self.ms = 0.37464 + 1.54226 * self.omegas - 0.26992 * self.omegas**2
+        self.sqrt_a_cs = np.sqrt(OMEGA_A * R**2 * self.Tcs**2 / self.Pcs)
+        self.bs = OMEGA_B * R * self.Tcs / self.Pcs
+        self.one_minus_kijs_T = np.ascontiguousarray((1 - self.kijs).T)
+
+    def sqrt_a_alphas(self, T):
+        """
+        :param T: temperatures (K), (m,)
+        :return: sqrt(a_i * alpha_i(T)), (m, n)
+        """
+        T = np.asarray(T, dtype=np.float64)[..., None]
+        return self.sqrt_a_cs * (1 + self.ms * (1 - np.sqrt(T / self.Tcs)))
+
+    def mix(self, T, xs):
+        """
+        Van der Waals mixing rules, a = sum_ij x_i x_j sqrt(a_i a_j) (1 - k_ij), computed as one matrix product instead
+        of the (m, n, n) outer product.
+
+        :param T: temperatures (K), (m,)
+        :param xs: mole fractions, (m, n)
+        :return: (a, b, a_ij_xs). a (m,), b (m,), and a_ij_xs = sum_j x_j a_ij, (m, n)
+        """
+        xs = np.asarray(xs, dtype=np.float64)
+        sqrt_a = self.sqrt_a_alphas(T)
+        a_ij_xs = sqrt_a * ((sqrt_a * xs) @ self.one_minus_kijs_T)
+        a = np.sum(xs * a_ij_xs, axis=-1)
+        b = xs @ self.bs
+        return a, b, a_ij_xs
+
+    def Z(self, T, P, xs, root='vapor'):
+        """
+        :param root: 'liquid' for the smallest, or 'vapor' for the largest root of the cubic. Or a boolean array, True
+            where the liquid root is wanted.
+        :return: compressibility factors, (m,)
+        """
+        a, b, _ = self.mix(T, xs)
+        A, B = self._reduced(T, P, a, b)
+        return Z_roots(A, B, root)
+
+    def lnphis(self, T, P, xs, root='vapor'):
+        """
+        :param root: see Z()
+        :return: ln of the fugacity coefficients of the components, (m, n)
+        """
+        a, b, a_ij_xs = self.mix(T, xs)
+        A, B = self._reduced(T, P, a, b)
+        Z = Z_roots(A, B, root)
+
+        A, B, Z, a, b = A[..., None], B[..., None], Z[..., None], a[..., None], b[..., None]
+        return (self.bs / b * (Z - 1) - np.log(Z - B)
+                - A / (2 * SQRT2 * B) * (2 * a_ij_xs / a - self.bs / b) * np.log((Z + (1 + SQRT2) * B) / (Z + (1 - SQRT2) * B)))
+
+    def lnphis_derivatives(self, T, P, xs, root='vapor'):
+        """
+        Analytic derivatives of lnphis(), for Newton solvers. The mole fractions are taken as independent variables, as
+        lnphis() evaluates them, without normalization: dlnphis_dxs is the derivative with respect to x_j at constant
+        x_k of the other components.
+
+        :param root: see Z()
+        :return: (lnphis, dlnphis_dT, dlnphis_dP, dlnphis_dxs). The first three (m, n), dlnphis_dxs (m, n, n) with
+            dlnphis_dxs[..., i, j] = d ln(phi_i) / d x_j
+        """
+        T = np.asarray(T, dtype=np.float64)
+        P = np.asarray(P, dtype=np.float64)
+        xs = np.asarray(xs, dtype=np.float64)
+        sqrt_a = self.sqrt_a_alphas(T)
+        dsqrt_a_dT = -self.sqrt_a_cs * self.ms / (2 * np.sqrt(T[..., None] * self.Tcs))
+        xs_sqrt_a = (sqrt_a * xs) @ self.one_minus_kijs_T
+        a_ij_xs = sqrt_a * xs_sqrt_a
+        a = np.sum(xs * a_ij_xs, axis=-1)
+        b = xs @ self.bs
+        A, B = self._reduced(T, P, a, b)
+        Z = Z_roots(A, B, root)
+
+        # Derivatives of sum_j x_j a_ij and of a. Temperature through alpha, composition through the x_j.
+        da_ij_xs_dT = dsqrt_a_dT * xs_sqrt_a + sqrt_a * ((dsqrt_a_dT * xs) @ self.one_minus_kijs_T)
+        da_dT = np.sum(xs * da_ij_xs_dT, axis=-1)
+        a_ij = sqrt_a[..., :, None] * sqrt_a[..., None, :] * (1 - self.kijs)
+        da_dxs = a_ij_xs + np.sum(xs[..., :, None] * a_ij, axis=-2)
+
+        # Stack the independent variables on a last axis: T, P, then x_1 ... x_n
+        shape, n = np.shape(Z), len(self.bs)
+        zero, zeros = np.zeros(shape + (1,)), np.zeros(shape + (n,))
+        da = np.concatenate([da_dT[..., None], zero, da_dxs], axis=-1)
+        db = np.concatenate([zero, zero, np.broadcast_to(self.bs, shape + (n,))], axis=-1)
+        da_ij_xs = np.concatenate([da_ij_xs_dT[..., None], np.zeros(shape + (n, 1)), np.broadcast_to(a_ij, shape + (n, n))], axis=-1)
+        dT_T = np.concatenate([np.broadcast_to(1 / T, shape)[..., None], zero, zeros], axis=-1)
+        dP_P = np.concatenate([zero, np.broadcast_to(1 / P, shape)[..., None], zeros], axis=-1)
+
+        a, b, A, B, Z = a[..., None], b[..., None], A[..., None], B[..., None], Z[..., None]
+        dA = A * (da / a + dP_P - 2 * dT_T)
+        dB = B * (db / b + dP_P - dT_T)
+
+        # Implicit derivative of the root of the cubic
+        g_Z = (3 * Z + 2 * (B - 1)) * Z + A - B * (3 * B + 2)
+        g_A = Z - B
+        g_B = Z * Z - (6 * B + 2) * Z + B * (3 * B + 2) - A
+        dZ = -(g_A * dA + g_B * dB) / g_Z
+
+        d1, d2 = Z + (1 + SQRT2) * B, Z + (1 - SQRT2) * B
+        L = np.log(d1 / d2)
+        dL = (dZ + (1 + SQRT2) * dB) / d1 - (dZ + (1 - SQRT2) * dB) / d2
+        C = A / (2 * SQRT2 * B)
+        dC = C * (dA / A - dB / B)
+
+        # Component axis before the variable axis
+        a, b, A, B, Z, C, L = a[..., None], b[..., None], A[..., None], B[..., None], Z[..., None], C[..., None], L[..., None]
+        da, db, dB, dZ, dC, dL = da[..., None, :], db[..., None, :], dB[..., None, :], dZ[..., None, :], dC[..., None, :], dL[..., None, :]
+        bs, a_ij_xs = self.bs[:, None], a_ij_xs[..., None]
+        D = 2 * a_ij_xs / a - bs / b
+        dD = 2 * da_ij_xs / a - 2 * a_ij_xs * da / (a * a) + bs * db / (b * b)
+
+        lnphis = bs / b * (Z - 1) - np.log(Z - B) - C * D * L
+        dlnphis = -bs * db / (b * b) * (Z - 1) + bs / b * dZ - (dZ - dB) / (Z - B) - (dC * D + C * dD) * L - C * D * dL
+        return lnphis[..., 0], dlnphis[..., 0], dlnphis[..., 1], dlnphis[..., 2:]
+
+    @staticmethod
+    def _reduced(T, P, a, b):
+        RT = R * np.asarray(T, dtype=np.float64)
+        return a * P / RT**2, b * P / RT
+
+
+def Z_roots(A, B, root='vapor'):
+    """
+    Analytic (Cardano / trigonometric) roots of the PR cubic
+    Z^3 - (1 - B) Z^2 + (A - 3 B^2 - 2 B) Z - (A B - B^2 - B^3) = 0
+    for arrays of A and B, polished with one Newton step.
+
+    :param root: 'liquid' for the smallest, or 'vapor' for the largest real root above B. Or a boolean array, True where
+        the liquid root is wanted.
+    :return: Z, same shape as A and B
+    """
+    A = np.asarray(A, dtype=np.float64)
+    B = np.asarray(B, dtype=np.float64)
+    c2 = B - 1
+    c1 = A - B * (3 * B + 2)
+    c0 = B * (B + B * B - A)
+
+    # Depressed cubic t^3 + p t + q = 0, with Z = t - c2 / 3
+    shift = c2 / 3
+    p = c1 - c2 * shift
+    q = 2 * shift**3 - shift * c1 + c0
+    disc = 0.25 * q * q + p * p * p / 27
+    one_root = disc > 0
+
+    # One real root
+    sqrt_disc = np.sqrt(np.maximum(disc, 0.0))
+    Z_one = np.cbrt(-0.5 * q + sqrt_disc) + np.cbrt(-0.5 * q - sqrt_disc) - shift
+
+    # Three real roots. cos(phi) is the largest, cos(phi - 2 pi / 3) the middle one, cos(phi + 2 pi / 3) the smallest.
+    r = 2 * np.sqrt(np.maximum(-p / 3, 1e-100))
+    phi = np.arccos(np.minimum(np.maximum(-4 * q / (r * r * r), -1.0), 1.0)) / 3
+    if isinstance(root, str):
+        if root == 'vapor':
+            Z_three = r * np.cos(phi) - shift
+        elif root == 'liquid':
+            Z_three = _smallest_root(r, phi, shift, B)
+        else:
+            raise ValueError("Unsupported root '%s'. Pick either 'liquid' or 'vapor'" % root)
+    else:
+        Z_three = np.where(root, _smallest_root(r, phi, shift, B), r * np.cos(phi) - shift)
+    Z = np.where(one_root, Z_one, Z_three)
+
+    # Newton polish, for the precision lost in the cancellations above
+    f = ((Z + c2) * Z + c1) * Z + c0
+    df = (3 * Z + 2 * c2) * Z + c1
+    with np.errstate(divide='ignore', invalid='ignore'):
+        step = np.where(df != 0, f / df, 0.0)
+    return Z - step
+
+
+def _smallest_root(r, phi, shift, B):
+    """
+    :return: smallest of the three real roots above the covolume B
+    """
+    Z_min = r * np.cos(phi + 2 * np.pi / 3) - shift
+    return np.where(Z_min > B, Z_min, r * np.cos(phi - 2 * np.pi / 3) - shift)
@@ -0,0 +1,107 @@
+"""
+Compact storage of resolved pseudo-component properties. PseudoComponent and GasFraction keep dictionaries of attributes
+per object. Here, a single pseudo-component is a PseudoRecord with __slots__, and a collection is one structured numpy
+array with a float64 field per property (72 bytes per pseudo-component), which the batch resolvers write into directly.
+Missing values are nan.
+"""
+import numpy as np
+
+
+FIELDS = ('mw', 'sg_gas', 'sg_liq', 'API', 'Tb', 'Tc', 'Pc', 'omega', 'ghv')
+record_dtype = np.dtype([(field, np.float64) for field in FIELDS])
+
+# Attribute names of PseudoComponent and GasFraction that are stored under a different field name
+attribute_fields = {'api': 'API', '_sg_liq': 'sg_liq'}
+
+
+class PseudoRecord(object):
+    __slots__ = FIELDS
+
+    def __init__(self, mw=np.nan, sg_gas=np.nan, sg_liq=np.nan, API=np.nan, Tb=np.nan, Tc=np.nan, Pc=np.nan, omega=np.nan, ghv=np.nan):
+        self.mw = mw
+        self.sg_gas = sg_gas
+        self.sg_liq = sg_liq
+        self.API = API
+        self.Tb = Tb
+        self.Tc = Tc
+        self.Pc = Pc
+        self.omega = omega
+        self.ghv = ghv
+
+    @classmethod
+    def from_attributes(cls, attributes):
+        """
+        :param attributes: PseudoComponent.attributes or GasFraction.attributes. Attributes without a field are dropped.
+        """
+        record = cls()
+        for key, value in attributes.items():
+            field = attribute_fields.get(key, key)
+            if field in FIELDS and value is not None:
+                setattr(record, field, float(value))
+        return record
+
+    @classmethod
+    def from_row(cls, row):
+        """
+        :param row: one element of a records array
+        """
+        return cls(*row.tolist())
+
+    def as_dict(self):
+        return {field: getattr(self, field) for field in FIELDS}
+
+    def __repr__(self):
+        return 'PseudoRecord(%s)' % ', '.join('%s=%r' % (field, getattr(self, field)) for field in FIELDS)
+
+
+def empty_records(n):
+    """
+    :return: records array of n pseudo-components, all nan
+    """
+    return np.full(n, np.nan, dtype=record_dtype)
+
+
+def records_from_columns(**columns):
+    """
+    :param columns: equal-length array-likes keyed by field name. Ex: records_from_columns(ghv=[5131, 4816])
+    :return: records array, nan for the fields that are not given
+    """
+    for key in columns:
+        if key not in FIELDS:
+            raise ValueError("Unsupported field '{}'. Available fields are {}".format(key, list(FIELDS)))
+    n = len(next(iter(columns.values()))) if columns else 0
+    records = empty_records(n)
+    for key, values in columns.items():
+        records[key] = values
+    return records
+
+
+def resolve_columns(columns, resolve):
+    """
+    Resolves the rows of a column store in groups of rows that share the same set of known values, with one call of
+    resolve per group, and writes the results back into the columns in place.
+
+    :param columns: dictionary of equal-length float64 arrays, nan where unknown. Fields of a records array work too, as
+        they are views.
+    :param resolve: resolver of one group. Called with a dictionary of the columns of the group, None for the unknowns,
+        and fills in what it solves.
+    """
+    names = list(columns.keys())
+    n = len(columns[names[0]]) if names else 0
+    if n == 0:
+        return
+
+    # One bit per column. np.unique over the integer codes is much faster than over the rows of a boolean matrix.
+    codes = np.zeros(n, dtype=np.int64)
+    for bit, name in enumerate(names):
+        codes |= (~np.isnan(columns[name])).astype(np.int64) << bit
+    patterns, group = np.unique(codes, return_inverse=True)
+
+    for pattern_index, code in enumerate(patterns):
+        rows = np.flatnonzero(group == pattern_index)
+        pattern = [bool(code >> bit & 1) for bit in range(len(names))]
+        attributes = {name: (columns[name][rows] if is_known else None) for name, is_known in zip(names, pattern)}
+        resolve(attributes)
+        for name, is_known in zip(names, pattern):
+            if not is_known and attributes[name] is not None:
+                columns[name][rows] = attributes[name]
@@ -0,0 +1,162 @@
+"""
+Tabulated surrogates of the iterative correlation inverses. A surrogate is a dense table of the solved unknown over a
+grid of the known arguments, interpolated (multi)linearly and, by default, polished with one Newton step of the exact
+residual. Batch inversions then cost a table lookup instead of an iterative solve.
+
+Tables are built on first use over the working range of their correlation and saved as .npy files, so later processes
+only load them. Queries outside of the table range are solved as usual. Disabled by default.
+
+Max. absolute error over the table range, against the exact solve:
+    Tb_mw_sg, Tb from (mw, sg_liq): 0.13 K interpolated, 1e-5 K polished. Along the mw_sg_liq curve, where
+        GasFraction queries it: 0.02 K interpolated, 5e-7 K polished.
+
+Ex:
+    import surrogates
+    surrogates.enable()
+    resolve_gas_fractions({'mw': mws})
+"""
+import os
+import numpy as np
+import correlations
+
+
+TABLE_VERSION = 1
+default_directory = os.path.join(os.path.expanduser('~'), '.cache', 'PhaseEnvelope-py', 'surrogates')
+
+enabled = False
+polish = True
+directory = default_directory
+
+
+class Surrogate(object):
+    """
+    Table of the unknown of a correlation over a regular grid of its known arguments. An axis is (low, high, n, log),
+    with the points evenly spaced in log of the argument if log is True.
+    """
+
+    def __init__(self, correlation_name, unknown, axes):
+        self.correlation_name = correlation_name
+        self.unknown = unknown
+        self.axes = axes
+        self.table = None
+
+    @property
+    def file_name(self):
+        return '%s.%s.v%d.npy' % (self.correlation_name, self.unknown, TABLE_VERSION)
+
+    def coordinates(self, values, axis):
+        low, high, n, log = axis
+        if log:
+            values, low, high = np.log(values), np.log(low), np.log(high)
+        return (values - low) / (high - low) * (n - 1)
+
+    def build(self):
+        """
+        :return: table of the unknown at every grid point, solved with correlations.bracketed_newton
+        """
+        correlation_func = getattr(correlations, self.correlation_name)
+        entry = correlations.registry[correlation_func]
+        i = entry['args'].index(self.unknown)
+
+        points = [np.geomspace(low, high, n) if log else np.linspace(low, high, n) for low, high, n, log in self.axes]
+        known = list(np.meshgrid(*points, indexing='ij'))
+
+        def fill(x):
+            return known[:i] + [x] + known[i:]
+
+        fprime = entry['fprime'].get(self.unknown)
+        low, high = entry['domain'][self.unknown]
+        table, _ = correlations.bracketed_newton(
+            lambda x: correlation_func(*fill(x)), low, high,
+            fprime=(lambda x: fprime(*fill(x))) if fprime else None, shape=known[0].shape)
+        return table
+
+    def load(self):
+        """
+        Loads the table from directory, or builds and saves it if the file is missing or does not match the grid.
+        """
+        path = os.path.join(directory, self.file_name)
+        shape = tuple(n for _, _, n, _ in self.axes)
+        try:
+            table = np.load(path)
+            if table.shape == shape:
+                self.table = table
+                return self.table
+        except (OSError, ValueError):
+            pass
+
+        self.table = self.build()
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = '%s.%d.tmp.npy' % (path[:-len('.npy')], os.getpid())
+        np.save(tmp_path, self.table)
+        os.replace(tmp_path, path)
+        return self.table
+
+    def interpolate(self, known):
+        """
+        :param known: known arguments of the correlation, in order. Scalars or equal-length arrays.
+        :return: interpolated unknown, nan outside of the table range
+        """
+        table = self.table if self.table is not None else self.load()
+        known = np.broadcast_arrays(*[np.asarray(value, dtype=np.float64) for value in known])
+
+        indices, weights, inside = [], [], np.ones(known[0].shape, dtype=bool)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            for values, axis in zip(known, self.axes):
+                coordinate = self.coordinates(values, axis)
+                inside &= (coordinate >= 0) & (coordinate <= axis[2] - 1)
+                index = np.clip(np.floor(np.nan_to_num(coordinate)), 0, axis[2] - 2).astype(np.intp)
+                indices.append(index)
+                weights.append(coordinate - index)
+
+        # Sum over the 2^d corners of the grid cell
+        value = np.zeros(known[0].shape)
+        for corner in range(2 ** len(self.axes)):
+            offsets = [(corner >> d) & 1 for d in range(len(self.axes))]
+            weight = np.ones(known[0].shape)
+            for w, offset in zip(weights, offsets):
+                weight = weight * (w if offset else 1 - w)
+            value = value + weight * table[tuple(index + offset for index, offset in zip(indices, offsets))]
+        return np.where(inside, value, np.nan)
+
+
+tables = {
+    # mw 10 ~ 1000 covers methane-like gas fractions up to the heaviest lumps, sg_liq 0.3 ~ 1.2 what mw_sg_liq yields
+    ('Tb_mw_sg', 'Tb'): Surrogate('Tb_mw_sg', 'Tb', [(10.0, 1000.0, 512, True), (0.3, 1.2, 256, False)]),
+}
+
+
+def enable(polish_result=True, path=None):
+    """
+    :param polish_result: whether to polish interpolated values with one Newton step of the exact residual
+    :param path: directory of the .npy tables. default_directory by default.
+    """
+    global enabled, polish, directory
+    enabled = True
+    polish = polish_result
+    directory = path or default_directory
+
+
+def disable():
+    global enabled
+    enabled = False
+
+
+def lookup(correlation_func, unknown, args):
+    """
+    :param args: arguments of correlation_func in order, with None in place of the unknown
+    :return: the unknown, nan where the known arguments are outside of the table range. None if there is no surrogate.
+    """
+    surrogate = tables.get((correlation_func.__name__, unknown))
+    if surrogate is None:
+        return None
+
+    i = [arg is None for arg in args].index(True)
+    value = surrogate.interpolate(args[:i] + args[i + 1:])
+
+    fprime = correlations.registry[correlation_func]['fprime'].get(unknown)
+    if polish and fprime is not None:
+        filled = args[:i] + [value] + args[i + 1:]
+        with np.errstate(invalid='ignore'):
+            value = value - correlation_func(*filled) / fprime(*filled)
+    return value
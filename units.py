@@ -0,0 +1,108 @@
+"""
+Unit conversion factors, precomputed once per process. Conversions are plain (vectorized) numpy multiplies, instead of
+formatting every value to a string and parsing it with pint. pint is only used by validate_factors(), which checks the
+factors against pint's unit definitions.
+"""
+import numpy as np
+
+
+# Base definitions, identical to pint's default registry
+BTU = 1055.056  # J, british thermal unit
+FT = 0.3048  # m
+IN = 0.0254  # m
+LB = 0.45359237  # kg
+GAL = 231 * IN**3  # m^3, US liquid gallon
+BBL = 42 * GAL  # m^3, oil barrel
+LBF = LB * 9.80665  # N
+PSI = LBF / IN**2  # Pa
+BAR = 1e5  # Pa
+MMHG = 133.322387415  # Pa
+
+# Multiplicative conversion factors, keyed by (from_unit, to_unit). Unit strings are parsable by pint.
+factors = {
+    ('joule/m^3', 'Btu/ft^3'): FT**3 / BTU,
+    ('joule/kg', 'Btu/lb'): LB / BTU,
+    ('Pa', 'psi'): 1 / PSI,
+    ('Pa', 'bar'): 1 / BAR,
+    ('Pa', 'mmHg'): 1 / MMHG,
+    ('m^3', 'ft^3'): 1 / FT**3,
+    ('m^3', 'oil_barrel'): 1 / BBL,
+    ('gallon', 'oil_barrel'): GAL / BBL,
+    ('kg/m^3', 'lb/ft^3'): FT**3 / LB,
+}
+factors.update({(to_unit, from_unit): 1 / factor for (from_unit, to_unit), factor in list(factors.items())})
+
+
+def convert(x, from_unit, to_unit):
+    """
+    :param x: scalar or array
+    :param from_unit: unit string of x. Ex: 'joule/m^3'
+    :param to_unit: unit string to convert to. Ex: 'Btu/ft^3'
+    :return: converted value. Arrays are converted with one vectorized multiply.
+    """
+    try:
+        factor = factors[(from_unit, to_unit)]
+    except KeyError:
+        raise ValueError("Unsupported conversion from '%s' to '%s'. Available conversions are %s" % (from_unit, to_unit, list(factors.keys())))
+    return np.multiply(x, factor)
+
+
+def K_to_R(K):
+    return np.multiply(K, 1.8)
+
+
+def R_to_K(R):
+    return np.divide(R, 1.8)
+
+
+def K_to_F(K):
+    return np.subtract(K, 273.15) * 1.8 + 32
+
+
+def F_to_K(F):
+    return np.subtract(F, 32) / 1.8 + 273.15
+
+
+def F_to_R(F):
+    return np.add(F, 459.67)
+
+
+def R_to_F(R):
+    return np.subtract(R, 459.67)
+
+
+def K_to_C(K):
+    return np.subtract(K, 273.15)
+
+
+def C_to_K(C):
+    return np.add(C, 273.15)
+
+
+def psi_to_Pa(psi):
+    return np.multiply(psi, PSI)
+
+
+def Pa_to_psi(Pa):
+    return np.divide(Pa, PSI)
+
+
+def validate_factors(rtol=1e-12):
+    """
+    Optional validation mode. Checks every precomputed factor against pint, which is imported only here.
+
+    :param rtol: relative tolerance
+    :return: dictionary of {(from_unit, to_unit): relative error}
+    """
+    import pint
+    ureg = pint.UnitRegistry()
+
+    errors = {}
+    for (from_unit, to_unit), factor in factors.items():
+        expected = ureg.Quantity(1.0, from_unit).to(to_unit).magnitude
+        errors[(from_unit, to_unit)] = abs(factor - expected) / abs(expected)
+
+    failed = {key: error for key, error in errors.items() if error > rtol}
+    if failed:
+        raise ValueError("Unit conversion factors do not match pint: %s" % failed)
+    return errors
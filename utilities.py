@@ -1,16 +1,12 @@
-import pandas as pd
+"""
+Sample gas analyses and the helpers of the heating value path. Kept free of pandas, scipy and thermo at import, which are
+loaded on first use by the modules that need them, so that importing this module stays fast.
+"""
 import numpy as np
-from thermo import ChemicalConstantsPackage, PRMIX, CEOSLiquid, CEOSGas, FlashVLN
-import thermo
-import chemicals
-from thermo.interaction_parameters import IPDB
-import pint
-import copy
-import fluids
 import config
-import timeit
-from scipy.optimize import newton
-import correlations
+import constants_cache
+from composition import normalize_rows
+from gpa_table import GPATable, get_GPA_table
 
 # StateCordell VRU
 statecordell = dict([
@@ -124,11 +120,6 @@ combs_sep_gas = dict([
 ])
 
 
-pd.set_option('display.max_columns', None)
-pd.set_option('display.max_rows', None)
-
-ureg = pint.UnitRegistry()
-
 settings = {
     "T_STANDARD": 288.70555,  # Temperature in Kelvin, 60F
     "P_STANDARD": 101325.0,    # Pressure in Pascal, 1 atm
@@ -144,19 +135,29 @@ def normalize_composition(comp_dict):
     """
     total_comp = sum(comp_dict.values())
     if total_comp > 0:
-        keys = list(comp_dict.keys())
-        last_key = keys[-1]
-        normalized_values = [v / total_comp for v in comp_dict.values()]
+        comp_dict = {key: value / total_comp for key, value in comp_dict.items()}
 
-        # Normalize all but the last element
-        comp_dict = {keys[i]: normalized_values[i] for i in range(len(keys) - 1)}
-
-        # Adjust the last element so that the sum is exactly 1
+        # Adjust the last non-zero element so that sum(comp_dict.values()) is exactly 1. The elements after it are 0.
+        last_key = [key for key, value in comp_dict.items() if value != 0][-1]
+        comp_dict[last_key] = 0
         comp_dict[last_key] = 1 - sum(comp_dict.values())
 
     return comp_dict
 
 
+def normalize_compositions(zs):
+    """
+    Row-wise equivalent of normalize_composition() for a whole (n_samples, n_components) matrix. The last non-zero
+    component of each row takes up the rounding, so that every row sums to exactly 1. Rows summing to 0 are left as is.
+
+    :param zs: (n_samples, n_components) un-normalized compositions
+    :return: normalized float64 copy of zs
+    """
+    zs = np.array(zs, dtype=np.float64, ndmin=2)
+    normalize_rows(zs)
+    return zs
+
+
 def check_properties_exists(constants):
     """
     :param constants: constants object of the thermo library
@@ -189,7 +190,7 @@ def ideal_gas_molar_volume():
     P = 101325 Pa, 1 atm, standard pressure
     :return: ideal gas molar volume in a standard condition (m^3/mol)
     """
-    return config.constants['R'] * config.constants['T_STANDARD'] / config.constants['P_STANDARD']
+    return config.settings.V_MOLAR
 
 
 def is_fraction(s):
@@ -201,26 +202,27 @@ def is_fraction(s):
 def get_ghvs_pure_compounds(constants, df_GPA):
     """
     :param constants: thermo's constants object
-    :param GPA_data: pandas dataframe of the GPA 2145-16 Table
+    :param df_GPA: GPATable, or pandas dataframe of the GPA 2145-16 Table
     :return:
     """
-    ghvs_ideal_gas = []
-    df = df_GPA
-    V_molar = ideal_gas_molar_volume()  # fixed 0.0236 m^3/mol at standard conditions for all compounds
-    for cas, name, Hc, rhol_60F_mass in zip(constants.CASs, constants.names, constants.Hcs, constants.rhol_60Fs_mass):
+    GPA_table = df_GPA if isinstance(df_GPA, GPATable) else GPATable(df_GPA)
+    ghvs_GPA, found = GPA_table.lookup('ghv', constants.CASs)
+
+    # Ideal gas heating values from the heats of combustion (J/mol), converted for all compounds at once
+    ghvs_Hc = np.array(constants.Hcs, dtype=np.float64) * config.settings.GHV_PER_HC
 
-        matching_row = df[df['CAS'] == cas]
+    ghvs_ideal_gas = []
+    for ghv_GPA, is_found, ghv_Hc, name, Hc, rhol_60F_mass in zip(ghvs_GPA, found, ghvs_Hc, constants.names, constants.Hcs, constants.rhol_60Fs_mass):
 
         # chemical is found in the GPA data table
-        if not matching_row.empty:
-            ghv_ideal_gas = matching_row['Gross Heating Value Ideal Gas [Btu/ft^3]'].iloc[0]
+        if is_found:
+            ghv_ideal_gas = ghv_GPA
 
-            if pd.isna(ghv_ideal_gas):
+            if np.isnan(ghv_ideal_gas):
 
                 # chemically inert or contains to combustible energy. Skip them. Ex: nitrogen, argon, helium
                 if Hc != 0:
-                    ghv_ideal_gas = Hc / V_molar
-                    ghv_ideal_gas = ureg('%.15f joule/m^3' % ghv_ideal_gas).to('Btu/ft^3')._magnitude * -1
+                    ghv_ideal_gas = ghv_Hc
                 else:
                     ghv_ideal_gas = 0
 
@@ -239,53 +241,56 @@ def get_ghvs_pure_compounds(constants, df_GPA):
                 """
                 pass  # Todo: implement a handler that can correlate API to ghv for a working range of the model. Show a warning sign if outside range. Prompt the user to activate ghv_correlate=True
             else:
-                ghv_ideal_gas = Hc / V_molar
-                ghv_ideal_gas = ureg('%.15f joule/m^3' % ghv_ideal_gas).to('Btu/ft^3')._magnitude * -1
+                ghv_ideal_gas = ghv_Hc
 
         ghvs_ideal_gas.append(ghv_ideal_gas)
     return np.array(ghvs_ideal_gas)
 
 
-df = pd.read_pickle("GPA 2145-16 Compound Properties Table - English.pkl")
+if __name__ == '__main__':
+    import pandas as pd
+
+    pd.set_option('display.max_columns', None)
+    pd.set_option('display.max_rows', None)
 
-#df = df[df['Compound'] != 'nitrogen']
+    GPA_table = get_GPA_table()
 
-comp_dict = combs_sep_gas
-comp_dict = normalize_composition(comp_dict)
+    comp_dict = combs_sep_gas
+    comp_dict = normalize_composition(comp_dict)
 
-comp_dict_pure = {}
-comp_dict_fraction = {}
-for key, value in comp_dict.items():
-    if is_fraction(key):
-        comp_dict_fraction[key] = value
-    else:
-        comp_dict_pure[key] = value
+    comp_dict_pure = {}
+    comp_dict_fraction = {}
+    for key, value in comp_dict.items():
+        if is_fraction(key):
+            comp_dict_fraction[key] = value
+        else:
+            comp_dict_pure[key] = value
 
-comps_pure = list(comp_dict_pure.keys())
-zs_pure = np.array(list(comp_dict_pure.values()))
-zs_fraction = list(comp_dict_fraction.values())[0]
+    comps_pure = list(comp_dict_pure.keys())
+    zs_pure = np.array(list(comp_dict_pure.values()))
+    zs_fraction = list(comp_dict_fraction.values())[0]
 
-constants_pure = ChemicalConstantsPackage.constants_from_IDs(comps_pure)
+    constants_pure = constants_cache.constants_from_IDs(comps_pure)
 
-# check if the compounds have molecular weight and normal boiling T data
-check_properties_exists(constants_pure)
+    # check if the compounds have molecular weight and normal boiling T data
+    check_properties_exists(constants_pure)
 
-ghvs_pure = get_ghvs_pure_compounds(constants_pure, df_GPA=df)
-wghtd_ghvs_pure = ghvs_pure * zs_pure
+    ghvs_pure = get_ghvs_pure_compounds(constants_pure, df_GPA=GPA_table)
+    wghtd_ghvs_pure = ghvs_pure * zs_pure
 
-ghv = 1736
+    ghv = 1736
 
-ghv_fraction = (ghv - sum(wghtd_ghvs_pure)) / zs_fraction
-whgtd_ghv_fraction = ghv_fraction * zs_fraction
+    ghv_fraction = (ghv - sum(wghtd_ghvs_pure)) / zs_fraction
+    whgtd_ghv_fraction = ghv_fraction * zs_fraction
 
-###########
+    ###########
 
-fraction_row = ['fraction', None, ghv_fraction, zs_fraction, whgtd_ghv_fraction]
-sum_row = ['Total', None, None, (sum(zs_pure) + zs_fraction) * 100, sum(wghtd_ghvs_pure) + whgtd_ghv_fraction]
+    fraction_row = ['fraction', None, ghv_fraction, zs_fraction, whgtd_ghv_fraction]
+    sum_row = ['Total', None, None, (sum(zs_pure) + zs_fraction) * 100, sum(wghtd_ghvs_pure) + whgtd_ghv_fraction]
 
-df_ghvs_table = pd.DataFrame(data=[comps_pure, constants_pure.CASs, ghvs_pure, zs_pure * 100, wghtd_ghvs_pure]).T
-df_ghvs_table.columns = ['Compound Name', 'CAS', 'Ideal Gas GHV [Btu/scf]', 'Mole Frac. [%]', 'Wghtd. Ideal Gas GVH [Btu/scf]']
-df_ghvs_table.loc[len(df_ghvs_table)] = fraction_row
-df_ghvs_table.loc[len(df_ghvs_table)] = sum_row
+    df_ghvs_table = pd.DataFrame(data=[comps_pure, constants_pure.CASs, ghvs_pure, zs_pure * 100, wghtd_ghvs_pure]).T
+    df_ghvs_table.columns = ['Compound Name', 'CAS', 'Ideal Gas GHV [Btu/scf]', 'Mole Frac. [%]', 'Wghtd. Ideal Gas GVH [Btu/scf]']
+    df_ghvs_table.loc[len(df_ghvs_table)] = fraction_row
+    df_ghvs_table.loc[len(df_ghvs_table)] = sum_row
 
-print(df_ghvs_table.to_string())
+    print(df_ghvs_table.to_string())
@@ -0,0 +1,177 @@
+"""
+Vapor pressures and Wilson K-values of a component set, for the initialization of flashes and phase envelopes. The
+coefficients of the components are gathered once into contiguous arrays, so that Psat(T) and K(T, P) of all components
+over a vector of temperatures are a few NumPy expressions, instead of a thermo VaporPressure object and a DataFrame
+lookup per component and temperature.
+
+Each component uses the first available of:
+1. Wagner, original form (McGarry)
+2. Wagner, 2.5-5 form (Poling)
+3. Antoine (Poling)
+4. Wilson's correlation from Tc, Pc and omega
+and falls back to Wilson's correlation outside of the temperature range of its coefficients. Pseudo-components, and
+compounds without coefficients, use Wilson's correlation only.
+
+.. [1] Poling, B. E., Prausnitz, J. M., O'Connell, J. P.: "The Properties of Gases and Liquids," fifth edition (2001),
+    New York: McGraw-Hill. Tables of the Wagner and Antoine coefficients.
+.. [2] McGarry, J.: "Correlation and Prediction of the Vapor Pressures of Pure Liquids over Large Pressure Ranges,"
+    Industrial & Engineering Chemistry Process Design and Development 22 (1983) 313-322.
+.. [3] Wilson, G. M.: "A Modified Redlich-Kwong Equation of State, Application to General Physical Data Calculations,"
+    65th National AIChE Meeting (1968), Cleveland, Ohio.
+"""
+import functools
+import numpy as np
+import constants_cache
+
+
+WAGNER_MCGARRY, WAGNER_POLING, ANTOINE_POLING, WILSON = 0, 1, 2, 3
+method_names = ('WAGNER_MCGARRY', 'WAGNER_POLING', 'ANTOINE_POLING', 'WILSON')
+
+
+def wilson_Ks(T, P, Tcs, Pcs, omegas):
+    """
+    source: [3]
+    notes: K = Pc / P * exp(5.373 * (1 + omega) * (1 - Tc / T))
+
+    :param T: temperature (K). Scalar, or (m,) array broadcast against P.
+    :param P: pressure (Pa). Scalar, or (m,) array broadcast against T.
+    :return: K-values, (n,) for a scalar T and P, (m, n) otherwise
+    """
+    T, P = np.asarray(T, dtype=np.float64)[..., None], np.asarray(P, dtype=np.float64)[..., None]
+    return Pcs / P * np.exp(5.373 * (1 + omegas) * (1 - Tcs / T))
+
+
+class VaporPressures(object):
+    """
+    Coefficient arrays of the vapor pressure correlations of a fixed component set, in the order of the components.
+    """
+
+    def __init__(self, CASs, Tcs, Pcs, omegas):
+        """
+        :param CASs: CAS numbers of the components. None for pseudo-components.
+        :param Tcs: critical temperatures (K), for Wilson's correlation
+        :param Pcs: critical pressures (Pa), for Wilson's correlation
+        :param omegas: acentric factors, for Wilson's correlation
+        """
+        self.CASs = list(CASs)
+        self.Tcs = np.asarray(Tcs, dtype=np.float64)
+        self.Pcs = np.asarray(Pcs, dtype=np.float64)
+        self.omegas = np.asarray(omegas, dtype=np.float64)
+
+        n = len(self.CASs)
+        self.methods = np.full(n, WILSON, dtype=np.intp)
+        self.coefficients = np.full((n, 4), np.nan)  # A, B, C, D
+        self.Tcs_fit = np.full(n, np.nan)  # critical constants the Wagner coefficients were fitted with
+        self.Pcs_fit = np.full(n, np.nan)
+        self.Tmins = np.full(n, -np.inf)
+        self.Tmaxs = np.full(n, np.inf)
+
+        tables = _coefficient_tables()
+        for i, cas in enumerate(self.CASs):
+            for method in (WAGNER_MCGARRY, WAGNER_POLING, ANTOINE_POLING):
+                index, values = tables[method]
+                if cas in index:
+                    A, B, C, D, Tc, Pc, Tmin, Tmax = values[index[cas]]
+                    self.methods[i] = method
+                    self.coefficients[i] = A, B, C, D
+                    self.Tcs_fit[i], self.Pcs_fit[i] = Tc, Pc
+                    self.Tmins[i], self.Tmaxs[i] = Tmin, Tmax
+                    break
+        self.columns = {method: np.flatnonzero(self.methods == method) for method in (WAGNER_MCGARRY, WAGNER_POLING, ANTOINE_POLING)}
+        self.columns = {method: columns for method, columns in self.columns.items() if len(columns)}
+
+    @classmethod
+    def from_IDs(cls, components):
+        """
+        :param components: component names or CAS numbers
+        """
+        constants = constants_cache.constants_from_IDs(components)
+        return cls(constants.CASs, constants.Tcs, constants.Pcs, constants.omegas)
+
+    def Psats(self, T):
+        """
+        :param T: temperature (K). Scalar, or (m,) array.
+        :return: vapor pressures (Pa), (n,) for a scalar T, (m, n) otherwise
+        """
+        T = np.asarray(T, dtype=np.float64)[..., None]
+        with np.errstate(invalid='ignore', divide='ignore', over='ignore'):
+            Psats = self.Pcs * np.exp(5.373 * (1 + self.omegas) * (1 - self.Tcs / T))
+            wilson = Psats.copy()
+
+            # Each correlation over the columns of its components only
+            for method, columns in self.columns.items():
+                A, B, C, D = self.coefficients[columns].T
+                if method == ANTOINE_POLING:
+                    Psats[..., columns] = 10 ** (A - B / (T + C))
+                    continue
+
+                Tr = T / self.Tcs_fit[columns]
+                tau = 1 - Tr
+                sqrt_tau = np.sqrt(tau)
+                if method == WAGNER_MCGARRY:
+                    tau3 = tau * tau * tau
+                    ln_Pr = (A * tau + B * tau * sqrt_tau + C * tau3 + D * tau3 * tau3) / Tr
+                else:
+                    tau2 = tau * tau
+                    ln_Pr = (A * tau + B * tau * sqrt_tau + C * tau2 * sqrt_tau + D * tau2 * tau2 * tau) / Tr
+                Psats[..., columns] = self.Pcs_fit[columns] * np.exp(ln_Pr)
+
+        in_range = (T >= self.Tmins) & (T <= self.Tmaxs)
+        return np.where(in_range, Psats, wilson)
+
+    def wilson_Ks(self, T, P):
+        """
+        :return: Wilson K-values, (n,) for a scalar T and P, (m, n) otherwise. See wilson_Ks().
+        """
+        return wilson_Ks(T, P, self.Tcs, self.Pcs, self.omegas)
+
+    def raoult_Ks(self, T, P):
+        """
+        :return: ideal K-values Psat(T) / P, (n,) for a scalar T and P, (m, n) otherwise
+        """
+        return self.Psats(T) / np.asarray(P, dtype=np.float64)[..., None]
+
+
+@functools.lru_cache(maxsize=None)
+def _coefficient_tables():
+    """
+    :return: {method: ({CAS: row}, (n_rows, 8) array of A, B, C, D, Tc, Pc, Tmin, Tmax)}, built once per process
+    """
+    from chemicals import vapor_pressure  # loads the coefficient tables on first use
+
+    tables = {}
+    for method, df in [(WAGNER_MCGARRY, vapor_pressure.Psat_data_WagnerMcGarry), (WAGNER_POLING, vapor_pressure.Psat_data_WagnerPoling), (ANTOINE_POLING, vapor_pressure.Psat_data_AntoinePoling)]:
+        n = len(df)
+        column = lambda name, default: df[name].to_numpy(dtype=np.float64) if name in df.columns else np.full(n, default)
+        Tcs = column('Tc', np.nan)
+        # Wagner's equation is undefined above the critical temperature it was fitted with
+        Tmaxs = np.fmin(column('Tmax', np.inf), Tcs) if method != ANTOINE_POLING else column('Tmax', np.inf)
+        values = np.column_stack([column('A', np.nan), column('B', np.nan), column('C', np.nan), column('D', 0.0), Tcs, column('Pc', np.nan), column('Tmin', -np.inf), Tmaxs])
+        tables[method] = ({cas: i for i, cas in enumerate(df.index)}, values)
+    return tables
+
+
+@functools.lru_cache(maxsize=32)
+def _get_vapor_pressures(components):
+    return VaporPressures.from_IDs(list(components))
+
+
+def get_vapor_pressures(components):
+    """
+    :return: VaporPressures of the component set, built once and reused afterwards
+    """
+    return _get_vapor_pressures(constants_cache.normalize_IDs(components))
+
+
+if __name__ == '__main__':
+    import timeit
+    from utilities import statecordell, is_fraction
+
+    components = [component for component in statecordell if not is_fraction(component)]
+    vapor_pressures = get_vapor_pressures(components)
+    print(dict(zip(components, [method_names[method] for method in vapor_pressures.methods])))
+
+    Ts = np.linspace(150, 400, 10000)
+    print(np.round(vapor_pressures.Psats(300.0)))
+    print(np.round(vapor_pressures.wilson_Ks(300.0, 2e6), 4))
+    print('%.2f ms for Psat of %d components at %d temperatures' % (1e3 * timeit.timeit(lambda: vapor_pressures.Psats(Ts), number=100) / 100, len(components), len(Ts)))